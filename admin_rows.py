@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from sqlalchemy import case, select
+
+from extensions import db
+from models import Donation, NGO, NGONeed
+from needs import is_open
+
+# rows are fetched from the cursor this many at a time while the page streams
+STREAM_BATCH = 500
+
+# Jinja yields one tiny string per template node; group them into
+# chunks of about this many bytes before they hit the socket
+STREAM_CHUNK_BYTES = 16 * 1024
+
+
+def buffered(chunks, size: int = STREAM_CHUNK_BYTES):
+    """Join a stream of small strings into ~`size`-byte chunks."""
+    pending, length = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(pending)
+            pending, length = [], 0
+    if pending:
+        yield "".join(pending)
+
+
+def donation_rows(status: str, order_by):
+    """
+    Lightweight rows for the admin donation lists: only the displayed
+    columns, as plain named-tuple rows (no ORM identity map, no change
+    tracking), fetched lazily so a streamed template holds one batch in
+    memory regardless of how many donations match.
+    """
+    stmt = (
+        select(
+            Donation.id,
+            Donation.tracking_id,
+            Donation.item_name,
+            Donation.description,
+            Donation.quantity,
+            Donation.condition,
+            Donation.donor_zone,
+            Donation.status,
+            NGO.name.label("ngo_name"),
+        )
+        .outerjoin(NGO, NGO.id == Donation.ngo_id)
+        .where(Donation.status == status)
+        .order_by(order_by)
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    return db.session.execute(stmt)
+
+
+def ngo_rows():
+    """
+    NGO rows for the admin NGO list with each NGO's newest open need
+    joined in, in one query instead of one query per NGO.
+    """
+    latest_need_id = (
+        select(NGONeed.id)
+        .where(NGONeed.ngo_id == NGO.id, is_open(datetime.utcnow()))
+        .order_by(NGONeed.created_at.desc())
+        .limit(1)
+        .correlate(NGO)
+        .scalar_subquery()
+    )
+    remaining = NGONeed.qty_required - NGONeed.qty_fulfilled
+
+    stmt = (
+        select(
+            NGO.id,
+            NGO.name,
+            NGO.accepted_categories,
+            NGO.zone,
+            NGO.has_pickup,
+            NGONeed.item_name.label("need_item_name"),
+            NGONeed.details.label("need_details"),
+            case((remaining > 0, remaining), else_=0).label("need_qty_remaining"),
+        )
+        .outerjoin(NGONeed, NGONeed.id == latest_need_id)
+        .order_by(NGO.name.asc())
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    return db.session.execute(stmt)
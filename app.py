@@ -1,8 +1,24 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, stream_template, request, redirect, url_for, session, flash, get_flashed_messages, send_from_directory, abort, g
 from config import Config
 from extensions import db
-from models import User, Donation, NGO, NGONeed
-from datetime import datetime
+from assets import init_assets
+from zones import init_zone_index, get_ngo_index, has_gazetteer, normalize_zone, zone_names
+from cache_versions import init_cache_versions
+from needs import init_needs, open_needs, sweep_needs, close_fulfilled_needs
+from directory import init_directory, get_directory, paginate
+from archive import archive_closed_donations, find_donation
+from bulk_actions import bulk_assign, bulk_reject, BulkActionError
+from profiling import init_profiling, list_profiles
+from rollups import refresh_rollups, refresh_rollups_for, report as rollup_report
+from admin_rows import donation_rows, ngo_rows, buffered
+from shards import (
+    city_shards, shard_keys, shard_for_city, city_for_shard, shard_for_tracking_id,
+    tracking_prefix, use_shard, run_on_all_shards, create_shard_tables, add_column_if_missing,
+)
+from extensions import current_shard, set_current_shard
+from models import User, Donation, NGO, NGONeed, Category
+from categories import DEFAULT_CATEGORIES, ensure_categories, set_ngo_categories, migrate_ngo_categories
+from datetime import datetime, timedelta
 import random
 import string
 import re
@@ -10,6 +26,8 @@ from flask import current_app
 import os
 import time
 import secrets
+import click
+from jinja2 import FileSystemBytecodeCache
 
 
 def create_app():
@@ -19,15 +37,101 @@ def create_app():
         template_folder="templates"
     )
     app.config.from_object(Config)
-    app.config["SERVER_INSTANCE_ID"] = secrets.token_hex(16)
+    app.config["SERVER_INSTANCE_ID"] = app.config["SERVER_INSTANCE_ID"] or secrets.token_hex(16)
     SESSION_TIMEOUT_SECONDS = 10 * 60  # 10 minutes
 
     db.init_app(app)
+    init_assets(app)
+    init_zone_index(app)
+    init_cache_versions(app)
+    init_needs(app)
+    init_directory(app)
+
+    if app.config.get("JINJA_BYTECODE_CACHE_DIR"):
+        os.makedirs(app.config["JINJA_BYTECODE_CACHE_DIR"], exist_ok=True)
+        app.jinja_options = {
+            **app.jinja_options,
+            "bytecode_cache": FileSystemBytecodeCache(app.config["JINJA_BYTECODE_CACHE_DIR"]),
+        }
+
+    # -------------- CLI commands ----------------
+    # Schema creation and seeding are deploy-time steps, not part of every boot:
+    #   flask init-db && flask seed && flask compile-templates
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create or upgrade the database schema in the main database and every city shard."""
+        init_database()
+        print(f"✅ Database tables created ({len(shard_keys())} shard(s))")
+
+    @app.cli.command("migrate-categories")
+    def migrate_categories_command():
+        """Convert comma-separated NGO categories into the category tables."""
+        for key in shard_keys():
+            with use_shard(key):
+                converted = migrate_ngo_categories()
+            print(f"✅ Migrated categories for {converted} NGO(s) in {city_for_shard(key)}")
+
+    @app.cli.command("archive-donations")
+    @click.option("--days", type=int, default=None,
+                  help="Archive donations closed more than this many days ago.")
+    def archive_donations_command(days):
+        """Move long-closed donations into the archive table."""
+        days = days if days is not None else app.config["ARCHIVE_AFTER_DAYS"]
+        for key in shard_keys():
+            with use_shard(key):
+                # rollups must see the final state of a donation before it leaves the hot table
+                refresh_rollups()
+                moved = archive_closed_donations(days)
+            print(f"✅ Archived {moved} donation(s) closed more than {days} day(s) ago in {city_for_shard(key)}")
+
+    @app.cli.command("refresh-rollups")
+    def refresh_rollups_command():
+        """Fold donations changed since the last run into the daily report rollups."""
+        for key in shard_keys():
+            with use_shard(key):
+                examined = refresh_rollups()
+            print(f"✅ Rollups refreshed from {examined} donation(s) in {city_for_shard(key)}")
+
+    @app.cli.command("sweep-needs")
+    def sweep_needs_command():
+        """Deactivate needs past their deadline."""
+        for key in shard_keys():
+            with use_shard(key):
+                expired = sweep_needs()
+            print(f"✅ Expired {expired} need(s) in {city_for_shard(key)}")
+
+    @app.cli.command("seed")
+    def seed_command():
+        """Seed default NGOs and the default admin user."""
+        for key in shard_keys():
+            with use_shard(key):
+                ensure_categories(DEFAULT_CATEGORIES)
+                db.session.commit()
 
-    with app.app_context():
-        db.create_all()
-        seed_ngos_if_empty()
-        seed_default_admin()
+        # the seed NGOs are all in Karachi
+        with use_shard(shard_for_city("Karachi")):
+            if seed_ngos_if_empty():
+                print("✅ Default NGOs created")
+            else:
+                print("🔹 NGOs already exist")
+
+        if seed_default_admin():
+            print("✅ Default admin created")
+        else:
+            print("🔹 Default admin already exists")
+
+    @app.cli.command("compile-templates")
+    def compile_templates_command():
+        """Compile every template once so workers start with a warm bytecode cache."""
+        names = app.jinja_env.list_templates(extensions=["html"])
+        for name in names:
+            app.jinja_env.get_template(name)
+
+        if app.config.get("JINJA_BYTECODE_CACHE_DIR"):
+            print(f"✅ Compiled {len(names)} template(s) into {app.config['JINJA_BYTECODE_CACHE_DIR']}")
+        else:
+            print(f"⚠️ Compiled {len(names)} template(s), but JINJA_BYTECODE_CACHE_DIR is not set so nothing was persisted")
 
     @app.before_request
     def enforce_session_security():
@@ -49,56 +153,75 @@ def create_app():
 
         session["last_seen"] = now
 
+    @app.before_request
+    def select_city_shard():
+        """
+        Route this request's NGO/donation queries to one city shard:
+        donors use their own city, admins the city they picked in the nav,
+        everyone else the default city. The public NGO pages can browse
+        any city with ?city=.
+        """
+        user = current_user()
+        if request.endpoint in ("public_ngos", "donor_ngos") and request.args.get("city"):
+            city = request.args.get("city")
+        elif user and user.role == "admin":
+            city = session.get("admin_city")
+        elif user:
+            city = user.city
+        else:
+            city = None
+        set_current_shard(shard_for_city(city))
+
     # -------------- Helper functions ----------------
 
-    def current_user():
-        uid = session.get("user_id")
-        if not uid:
-            return None
-        return User.query.get(uid)
-    
+    init_profiling(app, current_user)
+
     @app.context_processor
     def inject_user():
         return {"user": current_user()}
 
+    @app.context_processor
+    def inject_cities():
+        return {
+            "cities": list(city_shards()),
+            "current_city": city_for_shard(current_shard()),
+        }
+
     def login_required(role=None):
         def decorator(fn):
             from functools import wraps
 
             @wraps(fn)
             def wrapper(*args, **kwargs):
-                user = current_user()
-                if not user:
-                    flash("Please login first.", "warning")
-                    # If this is an admin-only route, send to admin login
-                    if role == "admin":
-                        return redirect(url_for("admin_login"))
-                    return redirect(url_for("login"))
-
-                if role and user.role != role:
-                    flash("You do not have permission.", "danger")
-
-                    # If user is admin but trying to access donor-only page
-                    if user.role == "admin":
-                        return redirect(url_for("admin_dashboard"))
-
-                    # If user is donor but trying to access admin-only page
-                    return redirect(url_for("donor_home"))
-
+                denied = check_access(role)
+                if denied is not None:
+                    return denied
                 return fn(*args, **kwargs)
 
             return wrapper
 
         return decorator
 
+    def update_rollups(donation_ids):
+        """
+        Keep report rollups current after the given donations changed. The
+        transition is already committed, so a failure here only delays the
+        numbers until the next `flask refresh-rollups`.
+        """
+        try:
+            refresh_rollups_for(donation_ids)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("Rollup refresh failed")
+
     def generate_tracking_id() -> str:
         """
-        Generate IDs like DN-001, DN-002, ...
-        Based on the last donation's ID.
+        Generate IDs like DN-001, DN-002, ... (DN-LAH-001 in the Lahore shard)
+        Based on the last donation's ID in the current city shard.
         """
         last = Donation.query.order_by(Donation.id.desc()).first()
         next_number = 1 if not last else last.id + 1
-        return f"DN-{next_number:03d}"
+        return f"{tracking_prefix(current_shard())}{next_number:03d}"
 
 
     # -------------- Routes ----------------
@@ -114,22 +237,71 @@ def create_app():
     
     @app.route("/ngos")
     def public_ngos():
-        ngos = NGO.query.order_by(NGO.name.asc()).all()
-
-        needs_map = {}
-        for ngo in ngos:
-            need = (
-                NGONeed.query
-                .filter(
-                    NGONeed.ngo_id == ngo.id,
-                    NGONeed.is_active == True
-                )
-                .order_by(NGONeed.created_at.desc())
-                .first()
-            )
-            needs_map[ngo.id] = need
+        category = request.args.get("category", "").strip()
+
+        query = NGO.query
+        if category:
+            # case-insensitive like /ngos/find: categories -> ngo_categories(category_id, ngo_id)
+            query = query.join(NGO.categories).filter(db.func.lower(Category.name) == category.lower())
+        ngos = query.order_by(NGO.name.asc()).all()
+
+        # newest open need per NGO from the cached open set, loaded in one query
+        open_set = open_needs()
+        latest_ids = [need_id for need_id in (open_set.latest_for(ngo.id) for ngo in ngos) if need_id]
+        needs_map = {
+            need.ngo_id: need
+            for need in (NGONeed.query.filter(NGONeed.id.in_(latest_ids)).all() if latest_ids else [])
+        }
+
+        all_categories = Category.query.order_by(Category.bit.asc()).all()
+
+        return render_template(
+            "list_ngos.html",
+            ngos=ngos,
+            needs_map=needs_map,
+            all_categories=all_categories,
+            selected_category=category,
+        )
+
+    @app.route("/ngos/find")
+    def donor_ngos():
+        category = request.args.get("category", "").strip()
+        zone = request.args.get("zone", "").strip()
+        within = request.args.get("within", "").strip()
+        pickup = request.args.get("pickup") == "1"
+        has_needs = request.args.get("needs") == "1"
+        page = request.args.get("page", "1")
+
+        # answered from the in-memory snapshot: no SQL once it is built, apart
+        # from the shared cache-version check every CACHE_VERSION_TTL seconds
+        directory = get_directory()
+        results = directory.search(
+            category=category,
+            zone=zone,
+            within_km=int(within) if within.isdigit() else None,
+            pickup=pickup,
+            has_needs=has_needs,
+        )
 
-        return render_template("list_ngos.html", ngos=ngos, needs_map=needs_map)
+        filters = {
+            "city": request.args.get("city", ""),
+            "category": category,
+            "zone": zone,
+            "within": within,
+            "pickup": "1" if pickup else "",
+            "needs": "1" if has_needs else "",
+        }
+
+        return render_template(
+            "donor_ngos.html",
+            page=paginate(results, int(page) if page.isdigit() else 1),
+            filters={k: v for k, v in filters.items() if v},
+            all_categories=directory.categories,
+            all_zones=zone_names(),
+            # cities without a gazetteer get no area matching or distances
+            distance_available=has_gazetteer(),
+            zone_unknown=bool(zone) and has_gazetteer() and normalize_zone(zone) is None,
+        )
 
     @app.route("/register", methods=["GET", "POST"])
     def register():
@@ -138,6 +310,7 @@ def create_app():
         email = ""
         phone = ""
         zone = ""
+        city = app.config["DEFAULT_CITY"]
 
         if request.method == "POST":
             full_name = request.form.get("full_name", "").strip()
@@ -146,6 +319,7 @@ def create_app():
             password = request.form.get("password", "")
             confirm_password = request.form.get("confirm_password", "")
             zone = request.form.get("zone", "").strip()
+            city = request.form.get("city", "").strip() or app.config["DEFAULT_CITY"]
 
             errors = []
             field_errors = {}
@@ -164,9 +338,13 @@ def create_app():
                 field_errors["phone"] = True
 
             if not zone:
-                errors.append("Zone (Area in Karachi) is required.")
+                errors.append("Zone (Area in your city) is required.")
                 field_errors["zone"] = True
 
+            if city not in city_shards():
+                errors.append("Please select a supported city.")
+                field_errors["city"] = True
+
             if not password:
                 errors.append("Password is required.")
                 field_errors["password"] = True
@@ -225,7 +403,7 @@ def create_app():
                 return render_template("register.html", field_errors=field_errors), 400
 
             # Create user (success)
-            user = User(full_name=full_name, email=email, phone=phone, zone=zone)
+            user = User(full_name=full_name, email=email, phone=phone, zone=zone, city=city)
             user.set_password(password)
             db.session.add(user)
             db.session.commit()
@@ -369,6 +547,7 @@ def create_app():
             donation = Donation(
                 tracking_id=tracking_id,
                 item_name=item_name,
+                category_manual=category_hint,
                 quantity=quantity_int,
                 condition=condition,
                 description=description or "",
@@ -379,6 +558,7 @@ def create_app():
 
             db.session.add(donation)
             db.session.commit()
+            update_rollups([donation.id])
 
             flash("Donation submitted successfully.", "success")
             return redirect(url_for("donation_success", tracking_id=tracking_id))
@@ -404,17 +584,18 @@ def create_app():
                 flash("Please enter your tracking ID.", "danger")
                 return redirect(url_for("track"))
 
+            # The tracking ID names its shard, so this is a single-shard lookup.
             # Only allow tracking of donations belonging to this logged-in user
-            donation = Donation.query.filter_by(
-                tracking_id=tracking_id,
-                donor_id=user.id
-            ).first()
+            # (archived donations are found transparently)
+            user_id = user.id
+            with use_shard(shard_for_tracking_id(tracking_id)):
+                donation = find_donation(tracking_id, user_id)
 
-            if not donation:
-                flash("No donation found with this tracking ID for your account.", "danger")
-                return redirect(url_for("track"))
+                if not donation:
+                    flash("No donation found with this tracking ID for your account.", "danger")
+                    return redirect(url_for("track"))
 
-            return render_template("track_result.html", donation=donation)
+                return render_template("track_result.html", donation=donation)
 
         # GET -> just show tracking form
         return render_template("track_form.html")
@@ -424,81 +605,137 @@ def create_app():
     @app.route("/admin/dashboard")
     @login_required(role="admin")
     def admin_dashboard():
-    
-        pending = Donation.query.filter_by(status="pending") \
-            .order_by(Donation.created_at.asc()).all()
-
-        assigned = Donation.query.filter_by(status="assigned") \
-            .order_by(Donation.assigned_at.desc()).all()
-        
-        rejected = Donation.query.filter_by(status="rejected") \
-            .order_by(Donation.rejected_at.desc()).all()
-        
-        ngos = NGO.query.order_by(NGO.name.asc()).all()
-        
+
+        def shard_counts():
+            by_status = dict(
+                db.session.query(Donation.status, db.func.count(Donation.id))
+                .group_by(Donation.status)
+                .all()
+            )
+            return {
+                "pending": by_status.get("pending", 0),
+                "assigned": by_status.get("assigned", 0),
+                "rejected": by_status.get("rejected", 0),
+                "ngos": db.session.query(db.func.count(NGO.id)).scalar(),
+            }
+
+        # one COUNT pass per city shard, all shards queried in parallel
+        city_counts = run_on_all_shards(shard_counts)
+        totals = {
+            name: sum(counts[name] for counts in city_counts.values())
+            for name in ("pending", "assigned", "rejected", "ngos")
+        }
+
         return render_template(
             "admin_dashboard.html",
-            pending=pending,
-            assigned=assigned,
-            rejected=rejected,
-            ngos=ngos,
+            totals=totals,
+            city_counts=city_counts,
             show_admin_header=True,
             hide_admin_navbar=False, 
         )
     
-    @app.route("/admin/donations/pending")
+    @app.route("/admin/city", methods=["POST"])
     @login_required(role="admin")
-    def admin_pending_donations():
-        donations = (
-            Donation.query
-            .filter_by(status="pending")
-            .order_by(Donation.created_at.asc())
-            .all()
-        )
-        return render_template(
+    def admin_select_city():
+        city = request.form.get("city", "")
+        if city in city_shards():
+            session["admin_city"] = city
+            flash(f"Now managing {city}.", "info")
+        # ids differ per shard, so never send the admin back to a detail page
+        return redirect(url_for("admin_dashboard"))
+
+    def stream_page(template, **context):
+        """
+        stream_template() for full pages. The session cookie is sent before
+        the layout renders, so the flashes are taken off the session here;
+        the layout's get_flashed_messages() then reads them from the request.
+        """
+        get_flashed_messages()
+        return buffered(stream_template(template, **context))
+
+    def render_donation_list(status, order_by, **context):
+        """
+        Stream an admin donation list: rows come straight from the cursor
+        and the HTML is sent as it is rendered, so memory stays flat and
+        the first bytes go out before the last row is read.
+        """
+        return stream_page(
             "admin_donations_list.html",
-            donations=donations,
-            page_title="Pending Donations",
-            status_label="Pending",
+            donations=donation_rows(status, order_by),
+            status_label=status.capitalize(),
+            page_title=f"{status.capitalize()} Donations",
             show_admin_header=True,
             hide_admin_navbar=False,
+            **context,
         )
 
-    @app.route("/admin/donations/assigned")
+    @app.route("/admin/donations/pending")
     @login_required(role="admin")
-    def admin_assigned_donations():
-        donations = (
-            Donation.query
-            .filter_by(status="assigned")
-            .order_by(Donation.assigned_at.desc())
-            .all()
+    def admin_pending_donations():
+        all_ngos = NGO.query.order_by(NGO.name.asc()).all()
+        open_ids = open_needs().ids
+        all_needs = (
+            NGONeed.query.filter(NGONeed.id.in_(open_ids)).order_by(NGONeed.created_at.desc()).all()
+            if open_ids else []
         )
-        return render_template(
-            "admin_donations_list.html",
-            donations=donations,
-            page_title="Assigned Donations",
-            status_label="Assigned",
-            show_admin_header=True,
-            hide_admin_navbar=False,
+        return render_donation_list(
+            "pending", Donation.created_at.asc(),
+            all_ngos=all_ngos, all_needs=all_needs, bulk_actions=True,
         )
 
+    @app.route("/admin/donations/bulk", methods=["POST"])
+    @login_required(role="admin")
+    def admin_bulk_donations():
+        action = request.form.get("action")
+        donation_ids = [i for i in request.form.getlist("donation_ids") if i.isdigit()]
+
+        if not donation_ids:
+            flash("Select at least one donation.", "warning")
+            return redirect(url_for("admin_pending_donations"))
+
+        try:
+            if action == "reject":
+                reason = request.form.get("reject_reason", "").strip()
+                if not reason:
+                    flash("Reject reason is required.", "danger")
+                    return redirect(url_for("admin_pending_donations"))
+                result = bulk_reject(donation_ids, reason)
+                done = "rejected"
+
+            elif action == "assign":
+                ngo_id = request.form.get("ngo_id", "")
+                need_id = request.form.get("need_id", "")
+                if not ngo_id.isdigit():
+                    flash("Please choose a valid NGO.", "danger")
+                    return redirect(url_for("admin_pending_donations"))
+                result = bulk_assign(donation_ids, int(ngo_id), int(need_id) if need_id.isdigit() else None)
+                done = "assigned"
+
+            else:
+                flash("Unknown bulk action.", "danger")
+                return redirect(url_for("admin_pending_donations"))
+
+        except BulkActionError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("admin_pending_donations"))
+
+        if result["updated"]:
+            update_rollups(result["updated"])
+            flash(f"{len(result['updated'])} donation(s) {done}.", "success")
+        for donation_id, reason in result["failed"].items():
+            flash(f"Donation #{donation_id} skipped: {reason}.", "warning")
+
+        return redirect(url_for("admin_pending_donations"))
+
+    @app.route("/admin/donations/assigned")
+    @login_required(role="admin")
+    def admin_assigned_donations():
+        return render_donation_list("assigned", Donation.assigned_at.desc())
+
     @app.route("/admin/donations/rejected")
     @login_required(role="admin")
     def admin_rejected_donations():
-        donations = (
-            Donation.query
-            .filter_by(status="rejected")
-            .order_by(Donation.rejected_at.desc())
-            .all()
-        )
-        return render_template(
-            "admin_donations_list.html",
-            donations=donations,
-            page_title="Rejected Donations",
-            status_label="Rejected",
-            show_admin_header=True,
-            hide_admin_navbar=False,
-        )
+        return render_donation_list("rejected", Donation.rejected_at.desc())
 
     
     @app.route("/admin/donation/<int:donation_id>", methods=["GET", "POST"])
@@ -521,6 +758,7 @@ def create_app():
                 donation.rejected_at = datetime.utcnow()
 
                 db.session.commit()
+                update_rollups([donation_id])
                 flash("Donation rejected.", "info")
                 return redirect(url_for("admin_dashboard"))
 
@@ -554,42 +792,83 @@ def create_app():
                                 need.qty_fulfilled = need.qty_required
 
                 db.session.commit()
+                update_rollups([donation_id])
 
                 flash(f"Donation assigned to {ngo.name}.", "success")
                 return redirect(url_for("admin_dashboard"))
 
         # also show all NGOs as fallback
         all_ngos = NGO.query.order_by(NGO.name.asc()).all()
-        all_needs = NGONeed.query.filter_by(is_active=True).order_by(NGONeed.created_at.desc()).all()
+        open_ids = open_needs().ids
+        all_needs = (
+            NGONeed.query.filter(NGONeed.id.in_(open_ids)).order_by(NGONeed.created_at.desc()).all()
+            if open_ids else []
+        )
+
+        # nearest NGOs to the donor that accept this category
+        ngos_by_id = {ngo.id: ngo for ngo in all_ngos}
+        suggested_ngos = [
+            (ngos_by_id[ngo_id], distance_km)
+            for ngo_id, distance_km in get_ngo_index().nearest(
+                donation.donor_zone, k=5, category=donation.category_manual
+            )
+            if ngo_id in ngos_by_id
+        ]
 
         return render_template(
             "admin_donation_detail.html",
             donation=donation,
             all_ngos=all_ngos,
             all_needs=all_needs,
+            suggested_ngos=suggested_ngos,
             show_admin_header=True,
             hide_admin_navbar=True, 
         )
 
+    @app.route("/admin/reports")
+    @login_required(role="admin")
+    def admin_reports():
+        days = request.args.get("days", "30")
+        days = min(int(days), 3650) if days.isdigit() and int(days) > 0 else 30
+
+        # reads only the rollup tables, never scans donations
+        data = rollup_report(days)
+        ngo_names = dict(db.session.query(NGO.id, NGO.name).all())
+
+        return render_template(
+            "admin_reports.html",
+            report=data,
+            days=days,
+            ngo_names=ngo_names,
+            show_admin_header=True,
+            hide_admin_navbar=False,
+        )
+
+    @app.route("/admin/profiles")
+    @login_required(role="admin")
+    def admin_profiles():
+        profiles = list_profiles(app.config["PROFILE_DIR"])
+        return render_template(
+            "admin_profiles.html",
+            profiles=profiles,
+            sample_rate=app.config["PROFILE_SAMPLE_RATE"],
+            show_admin_header=True,
+            hide_admin_navbar=False,
+        )
+
+    @app.route("/admin/profiles/<name>.folded")
+    @login_required(role="admin")
+    def admin_profile_download(name):
+        if not re.fullmatch(r"[\w.-]+", name):
+            abort(404)
+        return send_from_directory(app.config["PROFILE_DIR"], name + ".folded",
+                                   mimetype="text/plain", as_attachment=True)
+
     @app.route("/admin/ngos")
     @login_required(role="admin")
     def admin_ngos_list():
-        ngos = NGO.query.order_by(NGO.name.asc()).all()
-
-        needs_map = {}
-        for ngo in ngos:
-            need = (
-                NGONeed.query
-                .filter(
-                    NGONeed.ngo_id == ngo.id,
-                    NGONeed.is_active == True
-                )
-                .order_by(NGONeed.created_at.desc())
-                .first()
-            )
-            needs_map[ngo.id] = need
-
-        return render_template("admin_ngos_list.html", ngos=ngos, needs_map=needs_map,  show_admin_header=True, hide_admin_navbar=False)
+        # one query (NGOs + newest active need), streamed like the donation lists
+        return stream_page("admin_ngos_list.html", ngos=ngo_rows(), show_admin_header=True, hide_admin_navbar=False)
 
     
     @app.route("/admin/ngos/<int:ngo_id>/needs", methods=["GET", "POST"])
@@ -617,6 +896,19 @@ def create_app():
                 flash("Required quantity must be a positive number.", "danger")
                 return redirect(url_for("admin_manage_ngo_needs", ngo_id=ngo_id))
 
+            # optional deadline: the need stays open through the whole day
+            expires_on = request.form.get("expires_on", "").strip()
+            expires_at = None
+            if expires_on:
+                try:
+                    expires_at = datetime.strptime(expires_on, "%Y-%m-%d") + timedelta(days=1)
+                except ValueError:
+                    flash("Deadline must be a valid date.", "danger")
+                    return redirect(url_for("admin_manage_ngo_needs", ngo_id=ngo_id))
+                if expires_at <= datetime.utcnow():
+                    flash("Deadline must not be in the past.", "danger")
+                    return redirect(url_for("admin_manage_ngo_needs", ngo_id=ngo_id))
+
             need = NGONeed(
                 ngo_id=ngo.id,
                 item_name=item_name,
@@ -625,7 +917,8 @@ def create_app():
                 details=details or None,
                 qty_required=qty_required,
                 qty_fulfilled=0,
-                is_active=True
+                is_active=True,
+                expires_at=expires_at,
             )
             db.session.add(need)
             db.session.commit()
@@ -642,6 +935,10 @@ def create_app():
     def admin_toggle_need(need_id):
         need = NGONeed.query.get_or_404(need_id)
         need.is_active = not need.is_active
+        need.closed_reason = None
+        if need.is_active and need.expires_at and need.expires_at <= datetime.utcnow():
+            # re-opening an expired need drops its old deadline
+            need.expires_at = None
         db.session.commit()
         flash("Need status updated.", "success")
         return redirect(url_for("admin_manage_ngo_needs", ngo_id=need.ngo_id))
@@ -649,28 +946,99 @@ def create_app():
     return app
 
 
+# -------------- Auth helpers (shared with the ASGI read path) ----------------
+
+def current_user():
+    uid = session.get("user_id")
+    if not uid:
+        return None
+    # loaded once per request (the ASGI read path preloads it asynchronously)
+    user = g.get("_current_user")
+    if user is None or user.id != uid:
+        user = g._current_user = User.query.get(uid)
+    return user
+
+
+def check_access(role=None):
+    """
+    The check behind @login_required: None if the current user may open
+    the page, otherwise the redirect (with its flash) to send instead.
+    """
+    user = current_user()
+    if not user:
+        flash("Please login first.", "warning")
+        # If this is an admin-only route, send to admin login
+        if role == "admin":
+            return redirect(url_for("admin_login"))
+        return redirect(url_for("login"))
+
+    if role and user.role != role:
+        flash("You do not have permission.", "danger")
+
+        # If user is admin but trying to access donor-only page
+        if user.role == "admin":
+            return redirect(url_for("admin_dashboard"))
+
+        # If user is donor but trying to access admin-only page
+        return redirect(url_for("donor_home"))
+
+    return None
+
+
+def init_database():
+    """
+    Create missing tables and indexes in the main database and every city
+    shard, and bring databases created by older versions up to date: new
+    columns are added first (so new indexes on them can be built), NGOs
+    still holding only comma-separated categories are converted and needs
+    fulfilled before the need lifecycle existed are closed.
+    Safe to re-run.
+    """
+    add_column_if_missing(db.engine, "users", "city", "city VARCHAR(100)")
+    needs_lifecycle_added = set()
+    for key in shard_keys():
+        engine = db.engines[key] if key is not None else db.engine
+        add_column_if_missing(engine, "ngos", "category_mask", "category_mask INTEGER NOT NULL DEFAULT 0")
+        add_column_if_missing(engine, "ngo_needs", "expires_at", "expires_at DATETIME")
+        if add_column_if_missing(engine, "ngo_needs", "closed_reason", "closed_reason VARCHAR(20)"):
+            needs_lifecycle_added.add(key)
+
+    create_shard_tables()
+
+    for key in shard_keys():
+        with use_shard(key):
+            migrate_ngo_categories(only_unconverted=True)
+            if key in needs_lifecycle_added:
+                # one-off: later a fulfilled need an admin re-enabled must stay open
+                close_fulfilled_needs()
+                db.session.commit()
+
 
 def seed_default_admin():
     """
     Seed a fixed default Admin user if not already created.
+    Returns True if the admin was created.
     """
     admin_email = "admin@donation.com"
     admin_password = "Admin@123"
 
     existing = User.query.filter_by(email=admin_email).first()
-    if not existing:
-        admin = User(full_name="System Admin", email=admin_email, phone=None, zone=None, role="admin")
-        admin.set_password(admin_password)
-        db.session.add(admin)
-        db.session.commit()
-        print("✅ Default admin created")
-    else:
-        print("🔹 Default admin already exists")
+    if existing:
+        return False
+
+    admin = User(full_name="System Admin", email=admin_email, phone=None, zone=None, role="admin")
+    admin.set_password(admin_password)
+    db.session.add(admin)
+    db.session.commit()
+    return True
 
 def seed_ngos_if_empty():
-    """Seed ~20 Karachi NGOs for testing (only if table is empty)."""
+    """
+    Seed ~20 Karachi NGOs for testing (only if table is empty).
+    Returns True if NGOs were created.
+    """
     if NGO.query.first():
-        return
+        return False
 
     ngos = [
         NGO(
@@ -835,11 +1203,20 @@ def seed_ngos_if_empty():
         ),
     ]
 
+    ensure_categories(DEFAULT_CATEGORIES)
     for ngo in ngos:
+        set_ngo_categories(ngo, ngo.accepted_categories)
         db.session.add(ngo)
     db.session.commit()
+    return True
 
 if __name__ == "__main__":
     app = create_app()
+    # `python app.py` is the local dev entry point, so keep it zero-setup
+    with app.app_context():
+        init_database()
+        with use_shard(shard_for_city("Karachi")):
+            seed_ngos_if_empty()
+        seed_default_admin()
     app.run(debug=True)
 
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, insert, or_, select
+
+from extensions import db
+from models import ArchivedDonation, Donation
+
+# columns copied verbatim from donations -> donations_archive
+ARCHIVED_COLUMNS = [
+    "id", "tracking_id", "item_name", "category_manual", "quantity", "condition",
+    "description", "donor_zone", "status", "created_at", "assigned_at", "updated_at",
+    "rejected_reason", "rejected_at", "donor_id", "ngo_id", "need_id",
+]
+
+
+def archive_closed_donations(older_than_days: int, batch_size: int = 1000) -> int:
+    """
+    Move donations that were assigned or rejected more than `older_than_days`
+    ago from `donations` into `donations_archive`. Each batch is one
+    INSERT ... SELECT plus one DELETE in a single transaction.
+    Returns the number of donations archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    closed = or_(
+        and_(Donation.status == "rejected", Donation.rejected_at < cutoff),
+        and_(Donation.status == "assigned", Donation.assigned_at < cutoff),
+    )
+
+    # SQLite hands out max(id) + 1 for new rows, and tracking IDs are derived
+    # from the last donation id. Keeping the newest donation hot means
+    # neither can ever be reused for a row that already lives in the archive.
+    newest_id = db.session.query(func.max(Donation.id)).scalar()
+    if newest_id is None:
+        return 0
+
+    total = 0
+    while True:
+        ids = [
+            row[0] for row in db.session.execute(
+                select(Donation.id)
+                .where(closed, Donation.id < newest_id)
+                .order_by(Donation.id)
+                .limit(batch_size)
+            )
+        ]
+        if not ids:
+            break
+
+        source_columns = [getattr(Donation, name) for name in ARCHIVED_COLUMNS]
+        now = datetime.utcnow()
+        db.session.execute(
+            insert(ArchivedDonation).from_select(
+                ARCHIVED_COLUMNS + ["archived_at"],
+                select(*source_columns, db.literal(now)).where(Donation.id.in_(ids)),
+            )
+        )
+        db.session.execute(
+            delete(Donation).where(Donation.id.in_(ids)),
+            execution_options={"synchronize_session": False},
+        )
+        db.session.commit()
+        total += len(ids)
+
+    return total
+
+
+def find_donation(tracking_id: str, donor_id: int):
+    """
+    Look up a donor's donation by tracking ID in the hot table first and
+    fall back to the archive. Both have a unique index on tracking_id.
+    """
+    donation = Donation.query.filter_by(tracking_id=tracking_id, donor_id=donor_id).first()
+    if donation:
+        return donation
+    return ArchivedDonation.query.filter_by(tracking_id=tracking_id, donor_id=donor_id).first()
@@ -0,0 +1,223 @@
+"""
+ASGI entry point:
+
+    pip install uvicorn asgiref aiosqlite greenlet
+    SERVER_INSTANCE_ID=<random, per deploy> uvicorn asgi:app --workers 2
+
+(All workers must share SERVER_INSTANCE_ID, or logins made on one
+worker are dropped by the others; see config.py.)
+
+The read-heavy donor endpoints (/ngos and /track) run as async views on
+async SQLAlchemy engines, so a slow client or a long database read only
+parks a coroutine instead of holding a worker. Every other route (admin,
+donation form, login, static files) is the unchanged Flask WSGI app,
+run on a thread pool.
+"""
+import io
+import sys
+
+from asgiref.sync import AsyncToSync, sync_to_async
+from flask import flash, g, redirect, render_template, request, session, url_for
+
+from app import check_access, create_app, current_user
+from async_reads import AsyncDatabase, find_donation, load_user, ngo_listing
+from extensions import current_shard, set_current_shard
+from shards import shard_for_tracking_id
+
+
+# ---------------- async views ----------------
+
+async def public_ngos(adb):
+    category = request.args.get("category", "").strip()
+
+    async with adb.session(current_shard()) as s:
+        ngos, needs_map, all_categories = await ngo_listing(s, category)
+
+    return render_template(
+        "list_ngos.html",
+        ngos=ngos,
+        needs_map=needs_map,
+        all_categories=all_categories,
+        selected_category=category,
+    )
+
+
+async def track(adb):
+    # same check as @login_required(role="donor"); the user is preloaded by _dispatch()
+    denied = check_access("donor")
+    if denied is not None:
+        return denied
+    user = current_user()
+
+    if request.method == "POST":
+        tracking_id = request.form.get("tracking_id", "").strip()
+        if not tracking_id:
+            flash("Please enter your tracking ID.", "danger")
+            return redirect(url_for("track"))
+
+        # same single-shard lookup as the WSGI view
+        key = shard_for_tracking_id(tracking_id)
+        async with adb.session(key) as s:
+            donation = await find_donation(s, tracking_id, user.id)
+
+        if not donation:
+            flash("No donation found with this tracking ID for your account.", "danger")
+            return redirect(url_for("track"))
+
+        set_current_shard(key)
+        return render_template("track_result.html", donation=donation)
+
+    return render_template("track_form.html")
+
+
+ASYNC_VIEWS = {
+    # path: (methods, view)
+    "/ngos": (("GET",), public_ngos),
+    "/track": (("GET", "POST"), track),
+}
+
+
+# ---------------- ASGI <-> WSGI plumbing ----------------
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _environ(scope, body: bytes) -> dict:
+    """WSGI environ for an ASGI HTTP scope."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _start_message(status: int, headers) -> dict:
+    return {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    }
+
+
+class ReadPathASGI:
+    """ASGI app: async views for ASYNC_VIEWS, the Flask WSGI app for everything else."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.adb = AsyncDatabase(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise RuntimeError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+        environ = _environ(scope, await _read_body(receive))
+        route = ASYNC_VIEWS.get(environ["PATH_INFO"])
+        if route and environ["REQUEST_METHOD"] in route[0]:
+            await self._dispatch(route[1], environ, send)
+        else:
+            await sync_to_async(self._run_wsgi, thread_sensitive=False)(environ, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.adb.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, view, environ, send):
+        """
+        Flask's full_dispatch_request() with an awaitable view: the request
+        context, before/after_request hooks, session cookie and error
+        handlers all behave exactly as in the WSGI app.
+        """
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        error = None
+        ctx.push()
+        try:
+            try:
+                try:
+                    user_id = session.get("user_id")
+                    if user_id:
+                        # current_user() then finds it without a blocking query
+                        async with self.adb.session() as s:
+                            g._current_user = await load_user(s, user_id)
+
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(self.adb)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+
+            await send(_start_message(response.status_code, response.headers.items()))
+            await send({"type": "http.response.body", "body": response.get_data()})
+            response.close()
+        finally:
+            ctx.pop(error)
+
+    def _run_wsgi(self, environ, send):
+        """Run the Flask app on a worker thread, streaming its body back to the event loop."""
+        send = AsyncToSync(send)
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [_start_message(int(status.split(" ", 1)[0]), headers)]
+
+        body = self.flask_app(environ, start_response)
+        try:
+            for chunk in body:
+                if started:
+                    send(started.pop())
+                if chunk:
+                    send({"type": "http.response.body", "body": chunk, "more_body": True})
+            if started:
+                send(started.pop())
+            send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+
+app = ReadPathASGI(create_app())
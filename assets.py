@@ -0,0 +1,192 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import zlib
+
+from flask import request, send_from_directory, abort
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".html", ".json", ".txt")
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def build_assets(static_folder: str) -> dict:
+    """
+    Copy every static file into static/dist/ under a content-hashed name
+    (style.css -> style.3f2a9c1b7d4e.css), write .gz/.br siblings for text
+    assets and return the manifest {original: fingerprinted}.
+    """
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist_root, exist_ok=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        # never fingerprint our own output
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_root]
+
+        for name in files:
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, static_folder).replace(os.sep, "/")
+
+            stem, ext = os.path.splitext(rel)
+            hashed_rel = f"{stem}.{_hash_file(src)}{ext}"
+            dest = os.path.join(dist_root, hashed_rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+            with open(src, "rb") as f:
+                data = f.read()
+            with open(dest, "wb") as f:
+                f.write(data)
+
+            if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                with open(dest + ".gz", "wb") as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(dest + ".br", "wb") as f:
+                        f.write(brotli.compress(data, quality=11))
+
+            manifest[rel] = f"{DIST_DIR}/{hashed_rel}"
+
+    with open(os.path.join(dist_root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(static_folder: str) -> dict:
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _guess_mimetype(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def gzip_stream(chunks, level: int = 6):
+    """
+    Gzip a streamed body chunk by chunk. Every chunk is flushed, so the
+    client can render each part as soon as it arrives.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # a client that disconnects early must still end the template stream
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _accepts(encoding: str) -> bool:
+    # parsed with q-values: "gzip;q=0" refuses gzip, "*" accepts it
+    return request.accept_encodings[encoding] > 0
+
+
+def init_assets(app):
+    """
+    Wire the asset pipeline into the app:
+      - url_for('static', filename='style.css') resolves to the fingerprinted file
+      - fingerprinted files are served precompressed with immutable caching
+      - large HTML responses are gzipped on the fly, streamed ones chunk by chunk
+    """
+    static_folder = app.static_folder
+    manifest = load_manifest(static_folder)
+    fingerprinted = set(manifest.values())
+    app.config["ASSET_MANIFEST"] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = manifest.get(values["filename"], values["filename"])
+
+    def static(filename):
+        if filename not in fingerprinted:
+            # not built yet (or not a pipeline asset) -> normal Flask behaviour
+            return send_from_directory(static_folder, filename)
+
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            variant = os.path.join(static_folder, filename + suffix)
+            if _accepts(encoding) and os.path.exists(variant):
+                response = send_from_directory(
+                    static_folder,
+                    filename + suffix,
+                    mimetype=_guess_mimetype(filename),
+                    max_age=ONE_YEAR,
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            if not os.path.exists(os.path.join(static_folder, filename)):
+                abort(404)
+            response = send_from_directory(static_folder, filename, max_age=ONE_YEAR)
+
+        response.headers["Cache-Control"] = f"public, max-age={ONE_YEAR}, immutable"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    app.view_functions["static"] = static
+
+    @app.after_request
+    def compress_html(response):
+        min_size = app.config.get("COMPRESS_MIN_SIZE", 1024)
+
+        if (
+            response.mimetype != "text/html"
+            or response.status_code < 200
+            or response.status_code >= 300
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or not _accepts("gzip")
+        ):
+            return response
+
+        if response.is_streamed:
+            # streamed pages (the big admin lists) have no length up front:
+            # compress as they go instead of buffering the whole page
+            response.response = gzip_stream(response.response)
+            response.headers["Content-Encoding"] = "gzip"
+            response.headers.pop("Content-Length", None)
+            response.vary.add("Accept-Encoding")
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Fingerprint and precompress files in the static folder."""
+        built = build_assets(static_folder)
+        for original, hashed in sorted(built.items()):
+            print(f"{original} -> {hashed}")
+        print(f"✅ Built {len(built)} asset(s)" + ("" if brotli else " (brotli not installed, gzip only)"))
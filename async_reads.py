@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload, raiseload
+
+from models import ArchivedDonation, Category, Donation, NGO, NGONeed, User
+from needs import is_open
+
+# sync driver -> asyncio driver for the same database
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
+
+
+def async_url(url):
+    """sqlite:///app.db -> sqlite+aiosqlite:///app.db; URLs with an async driver are kept."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    return url.set(drivername=driver) if driver else url
+
+
+class AsyncDatabase:
+    """
+    Async engines for the main database and every city shard, built from
+    the same config as the Flask-SQLAlchemy ones. Used only by the ASGI
+    read path; all writes keep going through `db.session`.
+    """
+
+    def __init__(self, app):
+        urls = {None: app.config["SQLALCHEMY_DATABASE_URI"], **app.config["SQLALCHEMY_BINDS"]}
+        self.engines = {key: create_async_engine(async_url(url)) for key, url in urls.items()}
+        self._sessions = {
+            key: async_sessionmaker(engine, expire_on_commit=False)
+            for key, engine in self.engines.items()
+        }
+
+    def session(self, shard_key=None):
+        """New AsyncSession on one shard (None = the main database, which also holds users)."""
+        return self._sessions[shard_key]()
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+
+
+# ---------------- queries ----------------
+# Async sessions cannot lazy-load, so everything a template touches is
+# loaded up front and any other relationship access raises.
+
+async def load_user(session, user_id):
+    return await session.get(User, user_id)
+
+
+async def find_donation(session, tracking_id: str, donor_id: int):
+    """Async archive.find_donation(): hot table first, then the archive."""
+    for model in (Donation, ArchivedDonation):
+        donation = await session.scalar(
+            select(model)
+            .options(joinedload(model.ngo).raiseload("*"), raiseload("*"))
+            .filter_by(tracking_id=tracking_id, donor_id=donor_id)
+            .limit(1)
+        )
+        if donation:
+            return donation
+    return None
+
+
+async def ngo_listing(session, category: str = ""):
+    """
+    Data for the public NGO list: NGOs (optionally of one category), the
+    newest open need of each and all categories. Three queries.
+    """
+    query = select(NGO).options(raiseload("*"))
+    if category:
+        query = query.join(NGO.categories).filter(func.lower(Category.name) == category.lower())
+    ngos = (await session.scalars(query.order_by(NGO.name.asc()))).all()
+
+    needs_map = {}
+    if ngos:
+        needs = await session.scalars(
+            select(NGONeed)
+            .options(raiseload("*"))
+            .where(NGONeed.ngo_id.in_([ngo.id for ngo in ngos]), is_open(datetime.utcnow()))
+            .order_by(NGONeed.created_at.desc(), NGONeed.id.desc())
+        )
+        for need in needs:
+            needs_map.setdefault(need.ngo_id, need)
+
+    all_categories = (await session.scalars(select(Category).order_by(Category.bit.asc()))).all()
+    return ngos, needs_map, all_categories
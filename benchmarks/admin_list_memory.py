@@ -0,0 +1,95 @@
+"""
+Peak Python memory and time-to-first-byte for the streamed admin donation list.
+
+    python benchmarks/admin_list_memory.py [rows ...]    (default: 1000 10000 100000)
+
+For each size a throwaway SQLite database is filled with that many pending
+donations, then GET /admin/donations/pending is consumed chunk by chunk
+(like a WSGI server would) under tracemalloc.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def build_app(db_path, rows):
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+
+    from app import create_app, seed_default_admin
+    from config import Config
+    from extensions import db
+    from models import Donation, User
+    from shards import create_shard_tables
+
+    Config.SQLALCHEMY_DATABASE_URI = os.environ["DATABASE_URL"]
+    app = create_app()
+    with app.app_context():
+        create_shard_tables()
+        seed_default_admin()
+        donor = User(full_name="Bench Donor", email="bench@example.com", role="donor")
+        donor.set_password("bench@123")
+        db.session.add(donor)
+        db.session.commit()
+
+        now = datetime.utcnow()
+        batch = []
+        for i in range(1, rows + 1):
+            batch.append({
+                "tracking_id": f"DN-{i:07d}", "item_name": "School bags", "quantity": 3,
+                "condition": "Used", "description": "Lightly used, good condition",
+                "donor_zone": "Gulshan-e-Iqbal", "status": "pending", "donor_id": donor.id,
+                "created_at": now, "updated_at": now,
+            })
+            if len(batch) == 10000:
+                db.session.execute(db.insert(Donation), batch)
+                batch.clear()
+        if batch:
+            db.session.execute(db.insert(Donation), batch)
+        db.session.commit()
+    return app
+
+
+def measure(app):
+    client = app.test_client()
+    client.post("/admin/login", data={"email": "admin@donation.com", "password": "Admin@123"})
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    response = client.get("/admin/donations/pending", buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    response.close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, total, peak, size
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"{'rows':>9} {'first byte':>11} {'total':>9} {'peak mem':>10} {'html':>10}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = build_app(os.path.join(tmp, "bench.db"), rows)
+            first_byte, total, peak, size = measure(app)
+            with app.app_context():
+                from extensions import db
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+            print(f"{rows:>9} {first_byte * 1000:>9.1f}ms {total:>8.2f}s {peak / 1e6:>8.2f}MB {size / 1e6:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
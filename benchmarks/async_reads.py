@@ -0,0 +1,180 @@
+"""
+Concurrent-connection capacity of the sync (gunicorn) and ASGI (uvicorn) deployments.
+
+    pip install gunicorn uvicorn asgiref aiosqlite greenlet
+    python benchmarks/async_reads.py [connections ...]    (default: 10 50 200)
+
+Both servers run the same number of worker processes (WORKERS, default 2)
+against a throwaway seeded SQLite database. For every connection count the
+load generator keeps that many connections busy on GET /ngos for DURATION
+seconds. SLOW_SHARE of them are slow clients that dribble their request
+headers over SLOW_SECONDS, like donors on a bad mobile connection.
+Reported latency and throughput are for the normal clients only.
+
+Before the load, each server is checked to keep a login across its
+workers (they share one SERVER_INSTANCE_ID, as a deployment must).
+"""
+import asyncio
+import http.cookiejar
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+WORKERS = int(os.environ.get("WORKERS", 2))
+DURATION = float(os.environ.get("DURATION", 10))
+SLOW_SHARE = float(os.environ.get("SLOW_SHARE", 0.2))
+SLOW_SECONDS = float(os.environ.get("SLOW_SECONDS", 2))
+TIMEOUT = 10.0
+PATH = "/ngos"
+LOGIN_CHECKS = 20
+
+# seeded by `flask seed`
+ADMIN_EMAIL = "admin@donation.com"
+ADMIN_PASSWORD = "Admin@123"
+
+SERVERS = {
+    "sync (gunicorn)": [sys.executable, "-m", "gunicorn", "-w", str(WORKERS), "-b", "127.0.0.1:{port}",
+                        "--timeout", "60", "app:create_app()"],
+    "asgi (uvicorn)": [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(WORKERS),
+                       "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_database(env):
+    for command in ("init-db", "seed"):
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", command],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def start_server(command, port, env):
+    proc = subprocess.Popen([part.format(port=port) for part in command], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"server did not start: {' '.join(command)}")
+
+
+def lost_logins(port) -> int:
+    """Log in once, then count how many of LOGIN_CHECKS page loads bounced back to a login page."""
+    base = f"http://127.0.0.1:{port}"
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    form = urllib.parse.urlencode({"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}).encode()
+    opener.open(base + "/admin/login", form, timeout=TIMEOUT).read()
+
+    lost = 0
+    for _ in range(LOGIN_CHECKS):
+        # a new connection every time, so the requests spread over the workers
+        with opener.open(base + "/admin/dashboard", timeout=TIMEOUT) as response:
+            if response.geturl() != base + "/admin/dashboard":
+                lost += 1
+    return lost
+
+
+async def one_request(port, slow: bool):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        request = f"GET {PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode()
+        if slow:
+            pieces = [request[i:i + 8] for i in range(0, len(request), 8)]
+            for piece in pieces:
+                writer.write(piece)
+                await writer.drain()
+                await asyncio.sleep(SLOW_SECONDS / len(pieces))
+        else:
+            writer.write(request)
+            await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status = int(response.split(b" ", 2)[1]) if response else 0
+    return status, time.perf_counter() - started
+
+
+async def client(port, slow, deadline, latencies, counters):
+    while time.perf_counter() < deadline:
+        try:
+            status, elapsed = await asyncio.wait_for(one_request(port, slow), TIMEOUT)
+        except (asyncio.TimeoutError, OSError):
+            counters["errors"] += 1
+            continue
+        if status != 200:
+            counters["errors"] += 1
+        elif not slow:
+            latencies.append(elapsed)
+
+
+async def load(port, connections):
+    latencies, counters = [], {"errors": 0}
+    slow = int(connections * SLOW_SHARE)
+    deadline = time.perf_counter() + DURATION
+    await asyncio.gather(*(
+        client(port, i < slow, deadline, latencies, counters) for i in range(connections)
+    ))
+    return latencies, counters["errors"]
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    levels = [int(arg) for arg in sys.argv[1:]] or [10, 50, 200]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": "sqlite:///" + os.path.join(tmp, "bench.db"),
+            "SERVER_INSTANCE_ID": secrets.token_hex(16),
+        }
+        env.pop("CITY_SHARDS", None)
+        prepare_database(env)
+
+        print(f"GET {PATH}, {WORKERS} worker process(es), {DURATION:.0f}s per level, "
+              f"{SLOW_SHARE:.0%} slow clients ({SLOW_SECONDS:.0f}s to send headers)\n")
+        print(f"{'server':<18}{'conns':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+
+        for name, command in SERVERS.items():
+            port = free_port()
+            proc = start_server(command, port, env)
+            try:
+                lost = lost_logins(port)
+                if lost:
+                    raise RuntimeError(f"{name}: {lost}/{LOGIN_CHECKS} logged-in requests lost their session")
+                for connections in levels:
+                    latencies, errors = asyncio.run(load(port, connections))
+                    print(f"{name:<18}{connections:>7}{len(latencies) / DURATION:>9.1f}"
+                          f"{statistics.median(latencies) * 1000 if latencies else float('nan'):>9.0f}"
+                          f"{percentile(latencies, 0.95) * 1000:>9.0f}"
+                          f"{percentile(latencies, 0.99) * 1000:>9.0f}{errors:>8}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measure import-to-first-response time of the app in fresh processes.
+
+    python benchmarks/startup.py [runs] [path]
+
+Each run starts a new interpreter, imports app.py, calls create_app() and
+serves one request through the test client, which is what a freshly spawned
+worker does. Run `flask init-db && flask seed` first; set
+JINJA_BYTECODE_CACHE_DIR and run `flask compile-templates` to measure a warm
+template cache.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = """
+import time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+response = app.test_client().get({path!r})
+t3 = time.perf_counter()
+assert response.status_code < 500, response.status_code
+print(t1 - t0, t2 - t1, t3 - t2, t3 - t0)
+"""
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    path = sys.argv[2] if len(sys.argv) > 2 else "/ngos"
+
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(path=path)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        samples.append([float(x) for x in out.split()])
+
+    labels = ["import", "create_app", "first request", "total"]
+    print(f"{runs} cold starts, first request GET {path}")
+    for i, label in enumerate(labels):
+        values = [s[i] * 1000 for s in samples]
+        print(f"  {label:<14} median {statistics.median(values):7.1f} ms   min {min(values):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
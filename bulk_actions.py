@@ -0,0 +1,128 @@
+from datetime import datetime
+
+from sqlalchemy import case, func, select, update
+
+from extensions import db
+from models import Donation, NGO, NGONeed
+from needs import close_fulfilled_needs
+
+# largest primary key the database can hold (64-bit INTEGER); bigger ids
+# from the form would overflow the driver instead of simply not matching
+MAX_ID = 2 ** 63 - 1
+
+
+class BulkActionError(Exception):
+    """The whole batch was rolled back (e.g. rows changed underneath us)."""
+
+
+def _valid_id(value) -> bool:
+    return 0 < value <= MAX_ID
+
+
+def _eligible(donation_ids):
+    """
+    Split requested ids into pending donations and per-item failures.
+    Returns (eligible_ids, failures) where failures maps id -> reason.
+    """
+    ids = sorted({int(i) for i in donation_ids})
+    valid = [i for i in ids if _valid_id(i)]
+    rows = db.session.execute(
+        select(Donation.id, Donation.tracking_id, Donation.status).where(Donation.id.in_(valid))
+    ).all() if valid else []
+    found = {row.id: row for row in rows}
+
+    eligible, failures = [], {}
+    for donation_id in ids:
+        row = found.get(donation_id)
+        if row is None:
+            failures[donation_id] = "not found"
+        elif row.status != "pending":
+            failures[donation_id] = f"{row.tracking_id} is already {row.status}"
+        else:
+            eligible.append(donation_id)
+    return eligible, failures
+
+
+def _apply(statement, expected: int):
+    result = db.session.execute(statement, execution_options={"synchronize_session": False})
+    if result.rowcount != expected:
+        db.session.rollback()
+        raise BulkActionError("Some donations changed while processing; nothing was updated. Please retry.")
+
+
+def bulk_reject(donation_ids, reason: str) -> dict:
+    """
+    Reject all pending donations in `donation_ids` with one UPDATE and one commit.
+    Returns {"updated": [ids], "failed": {id: reason}}.
+    """
+    eligible, failures = _eligible(donation_ids)
+    if eligible:
+        now = datetime.utcnow()
+        _apply(
+            update(Donation)
+            .where(Donation.id.in_(eligible), Donation.status == "pending")
+            .values(status="rejected", rejected_reason=reason, rejected_at=now, updated_at=now),
+            len(eligible),
+        )
+        db.session.commit()
+    return {"updated": eligible, "failed": failures}
+
+
+def bulk_assign(donation_ids, ngo_id: int, need_id=None) -> dict:
+    """
+    Assign all pending donations in `donation_ids` to one NGO (and optionally
+    one of its needs) in a single transaction: one UPDATE for the donations,
+    one for the NGO load, one for the need's fulfilled quantity and one that
+    closes the need if that fulfilled it.
+    Returns {"updated": [ids], "failed": {id: reason}}.
+    """
+    ngo = db.session.get(NGO, ngo_id) if _valid_id(ngo_id) else None
+    if not ngo:
+        raise BulkActionError("Please choose a valid NGO.")
+
+    need = None
+    if need_id:
+        need = db.session.get(NGONeed, need_id) if _valid_id(need_id) else None
+        if not need or need.ngo_id != ngo.id:
+            raise BulkActionError("The selected need does not belong to this NGO.")
+
+    eligible, failures = _eligible(donation_ids)
+    if not eligible:
+        return {"updated": [], "failed": failures}
+
+    now = datetime.utcnow()
+    _apply(
+        update(Donation)
+        .where(Donation.id.in_(eligible), Donation.status == "pending")
+        .values(status="assigned", ngo_id=ngo.id, need_id=need.id if need else None,
+                assigned_at=now, updated_at=now),
+        len(eligible),
+    )
+
+    _apply(
+        update(NGO)
+        .where(NGO.id == ngo.id)
+        .values(current_load=func.coalesce(NGO.current_load, 0) + len(eligible)),
+        1,
+    )
+
+    if need:
+        increment = db.session.execute(
+            select(func.coalesce(func.sum(Donation.quantity), 0)).where(Donation.id.in_(eligible))
+        ).scalar()
+        if increment > 0:
+            # same rule as a single assignment: never exceed the required quantity
+            fulfilled = func.coalesce(NGONeed.qty_fulfilled, 0) + increment
+            _apply(
+                update(NGONeed)
+                .where(NGONeed.id == need.id)
+                .values(
+                    qty_fulfilled=case((fulfilled > NGONeed.qty_required, NGONeed.qty_required), else_=fulfilled),
+                    updated_at=now,
+                ),
+                1,
+            )
+            close_fulfilled_needs([need.id])
+
+    db.session.commit()
+    return {"updated": eligible, "failed": failures}
@@ -0,0 +1,77 @@
+import time
+
+from flask import current_app
+from sqlalchemy import event, insert, select, update
+
+from extensions import db, ShardedSession
+from models import CacheVersion
+from shards import current_shard
+
+# names of the cached read models
+OPEN_NEEDS = "open_needs"
+DIRECTORY = "directory"
+NGO_INDEX = "ngo_index"
+CATEGORIES = "categories"
+
+_BUMPED = "cache_versions_bumped"
+
+_versions = {}  # shard key -> (monotonic time read, {name: version})
+
+
+def bump_version(session, name: str):
+    """
+    Move cache `name` of the current shard to a new version inside the
+    session's transaction, so every process sees the new version exactly
+    when it can see the change. Once per name and transaction; safe to
+    call from flush and execute hooks.
+    """
+    key = (current_shard(), name)
+    bumped = session.info.setdefault(_BUMPED, set())
+    if key in bumped:
+        return
+    bumped.add(key)
+
+    # straight on the connection: no autoflush, no ORM events
+    conn = session.connection(bind_arguments={"mapper": CacheVersion})
+    table = CacheVersion.__table__
+    result = conn.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if not result.rowcount:
+        conn.execute(insert(table).values(name=name, version=1))
+
+
+def current_version(name: str) -> int:
+    """
+    Committed version of cache `name` on the current shard. All versions
+    are read in one query, at most once per CACHE_VERSION_TTL seconds per
+    process, and again right after the process commits a change of its
+    own; in between, cached reads need no SQL at all.
+    """
+    key = current_shard()
+    now = time.monotonic()
+    cached = _versions.get(key)
+    if cached is None or now - cached[0] >= current_app.config.get("CACHE_VERSION_TTL", 2):
+        versions = dict(db.session.execute(select(CacheVersion.name, CacheVersion.version)).all())
+        cached = _versions[key] = (now, versions)
+    return cached[1].get(name, 0)
+
+
+def _reread_after_commit(session):
+    if session.info.pop(_BUMPED, None):
+        _versions.clear()
+
+
+def _forget_after_rollback(session):
+    session.info.pop(_BUMPED, None)
+
+
+def init_cache_versions(app):
+    """Let each process tell whether its cached copies are still current."""
+    listeners = (
+        ("after_commit", _reread_after_commit),
+        ("after_rollback", _forget_after_rollback),
+    )
+    for name, fn in listeners:
+        if not event.contains(ShardedSession, name, fn):
+            event.listen(ShardedSession, name, fn)
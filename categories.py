@@ -0,0 +1,112 @@
+from cache_versions import CATEGORIES, bump_version, current_version
+from extensions import db
+from models import CacheVersion, Category, NGO, ngo_categories
+from shards import add_column_if_missing, current_shard
+
+# Categories offered on the donation form, in bit order
+DEFAULT_CATEGORIES = ["Food", "Clothes", "Education", "Medical", "Electronics", "Furniture"]
+
+# per shard: bits are assigned independently in every city database
+_bits_cache = {}  # shard key -> (cache version, bits)
+
+
+def category_bits() -> dict:
+    """
+    {lowercased category name: bit value} for the current shard, cached
+    until any process adds a category.
+    """
+    key = current_shard()
+    version = current_version(CATEGORIES)
+    cached = _bits_cache.get(key)
+    if cached is None or cached[0] != version:
+        cached = _bits_cache[key] = (version, {c.name.lower(): 1 << c.bit for c in Category.query.all()})
+    return cached[1]
+
+
+def category_bit(name) -> int:
+    """Bit value for one category name, 0 if the category does not exist."""
+    if not name:
+        return 0
+    return category_bits().get(name.strip().lower(), 0)
+
+
+def parse_category_names(value) -> list:
+    """'Food, Clothes,,food' -> ['Food', 'Clothes'] (order kept, case-insensitive dedupe)."""
+    names, seen = [], set()
+    for part in (value or "").split(","):
+        name = part.strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def ensure_categories(names) -> list:
+    """
+    Return Category rows for `names`, creating missing ones with the next
+    free bit. Does not commit.
+    """
+    wanted = {n.lower(): n for n in names}
+    existing = {
+        c.name.lower(): c
+        for c in Category.query.filter(db.func.lower(Category.name).in_(list(wanted))).all()
+    } if wanted else {}
+
+    created = False
+    next_bit = None
+    for key, name in wanted.items():
+        if key in existing:
+            continue
+        if next_bit is None:
+            next_bit = (db.session.query(db.func.max(Category.bit)).scalar() or -1) + 1
+        category = Category(name=name, bit=next_bit)
+        db.session.add(category)
+        existing[key] = category
+        next_bit += 1
+        created = True
+
+    if created:
+        db.session.flush()
+        bump_version(db.session, CATEGORIES)
+
+    return [existing[n.lower()] for n in names]
+
+
+def set_ngo_categories(ngo, names):
+    """
+    Set an NGO's categories from a list of names or a comma-separated
+    string, keeping the association, bitmask and display string in sync.
+    """
+    if not isinstance(names, str):
+        names = ",".join(names)
+    categories = ensure_categories(parse_category_names(names))
+    ngo.categories = categories
+    ngo.category_mask = sum(1 << c.bit for c in categories)
+    ngo.accepted_categories = ",".join(c.name for c in categories) or None
+
+
+def migrate_ngo_categories(only_unconverted: bool = False) -> int:
+    """
+    One-off migration from the comma-separated NGO.accepted_categories
+    column: adds ngos.category_mask to older databases, creates the
+    category rows and fills the association table and mask for every NGO
+    (or, with `only_unconverted`, for NGOs that have categories text but no
+    mask yet). Safe to re-run. Returns the number of NGOs converted.
+    """
+    engine = db.session.get_bind(mapper=NGO)  # the current city shard
+    add_column_if_missing(engine, "ngos", "category_mask", "category_mask INTEGER NOT NULL DEFAULT 0")
+
+    # new tables (categories, ngo_categories, cache_versions) only
+    db.metadata.create_all(engine, tables=[Category.__table__, ngo_categories, CacheVersion.__table__])
+
+    ensure_categories(DEFAULT_CATEGORIES)
+
+    query = NGO.query
+    if only_unconverted:
+        query = query.filter(NGO.category_mask == 0, NGO.accepted_categories.isnot(None),
+                             NGO.accepted_categories != "")
+    ngos = query.all()
+    for ngo in ngos:
+        set_ngo_categories(ngo, ngo.accepted_categories or "")
+    db.session.commit()
+    return len(ngos)
@@ -2,12 +2,75 @@ import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+def _city_shards_from_env():
+    """
+    CITY_SHARDS="Lahore=sqlite:////data/lahore.db,Islamabad=postgresql://..."
+    -> ({"Lahore": "lahore", ...}, {"lahore": "sqlite:////data/lahore.db", ...})
+    The default city always lives in the main database.
+    """
+    shards, binds, codes = {}, {}, {}
+    for entry in filter(None, os.environ.get("CITY_SHARDS", "").split(",")):
+        city, _, url = entry.partition("=")
+        key = city.strip().lower()
+        # tracking IDs carry the first three letters (shards.shard_code()),
+        # so two shards sharing them would make IDs ambiguous
+        code = key[:3].upper()
+        if not key or key in binds or code in codes:
+            raise ValueError(
+                f"CITY_SHARDS: {city.strip()!r} clashes with {codes.get(code, city.strip())!r}; "
+                "every city needs a unique name whose first three letters are unique"
+            )
+        codes[code] = city.strip()
+        shards[city.strip()] = key
+        binds[key] = url.strip()
+    return shards, binds
+
+
+_EXTRA_SHARDS, _SHARD_BINDS = _city_shards_from_env()
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-change-me")
+    # Logins from another server instance are dropped, so a restart logs
+    # everyone out. Unset = a random id per process, which is only right for
+    # a single worker: multi-worker servers (gunicorn -w, uvicorn --workers)
+    # must share one id, e.g. a fresh random value set on every deploy.
+    SERVER_INSTANCE_ID = os.environ.get("SERVER_INSTANCE_ID")
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or \
         "sqlite:///" + os.path.join(basedir, "donation_routing.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # city -> SQLALCHEMY_BINDS key holding that city's NGOs and donations
+    # (None = the main database). Users are never sharded.
+    DEFAULT_CITY = "Karachi"
+    CITY_SHARDS = {"Karachi": None, **_EXTRA_SHARDS}
+    SQLALCHEMY_BINDS = _SHARD_BINDS
     SESSION_PERMANENT = False
 
+    # HTML responses smaller than this (bytes) are sent uncompressed
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+
+    # Directory for compiled Jinja templates (filled by `flask compile-templates`).
+    # Leave unset to compile templates in memory on first use.
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get("JINJA_BYTECODE_CACHE_DIR")
+
+    # In-memory caches (open needs, donor directory, NGO index, category bits)
+    # check the shared cache versions at most this often per process, so a
+    # change committed by another worker or CLI job shows up within this
+    # many seconds. Changes made by the process itself show up at once.
+    CACHE_VERSION_TTL = float(os.environ.get("CACHE_VERSION_TTL", 2))
+
+    # `flask archive-donations` moves donations assigned/rejected longer ago than this
+    ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 90))
+
+    # Request profiler: admins can profile any request with `X-Profile: 1` or
+    # `?profile=1` (recorded with cProfile); additionally this fraction of all
+    # requests is profiled by a stack sampler every PROFILE_INTERVAL_MS, which
+    # is raised to the interpreter's thread switch interval (5 ms) if lower.
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0))
+    PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(basedir, "instance", "profiles")
+    PROFILE_KEEP = 200
+
  
 
@@ -0,0 +1,191 @@
+import math
+import threading
+from collections import namedtuple
+from itertools import chain
+
+from sqlalchemy import event, inspect, select
+
+from cache_versions import DIRECTORY, bump_version, current_version
+from extensions import db, ShardedSession
+from models import Category, NGO, NGONeed
+from needs import open_needs
+from shards import current_shard
+from zones import zone_point
+
+PER_PAGE = 12
+
+# NGO columns that only matter to admins; changing them keeps the snapshot
+_IGNORED_NGO_COLUMNS = {"current_load", "donations", "needs"}
+
+DirectoryNGO = namedtuple(
+    "DirectoryNGO",
+    "id name zone address accepted_categories category_mask has_pickup point needs",
+)
+DirectoryNeed = namedtuple(
+    "DirectoryNeed",
+    "id item_name category details condition_needed qty_remaining deadline",
+)
+Page = namedtuple("Page", "items number pages total")
+
+
+class Directory:
+    """
+    Immutable snapshot of one shard's NGOs and their open needs for the
+    donor directory. Built with three queries; every search afterwards runs
+    in memory, so any number of concurrent donors can filter it without
+    touching the database.
+    """
+
+    def __init__(self, ngos, needs, categories, open_set, version):
+        self.open_set = open_set  # the open-needs snapshot this was built from
+        self.version = version  # cache version the rows were read under
+        self.categories = tuple(name for name, _ in categories)
+        self._bits = {name.lower(): 1 << bit for name, bit in categories}
+
+        needs_by_ngo = {}
+        for need in needs:
+            needs_by_ngo.setdefault(need.ngo_id, []).append(
+                DirectoryNeed(
+                    need.id, need.item_name, need.category, need.details, need.condition_needed,
+                    max(0, (need.qty_required or 0) - (need.qty_fulfilled or 0)),
+                    need.deadline,
+                )
+            )
+
+        self.entries = tuple(
+            DirectoryNGO(
+                ngo.id, ngo.name, ngo.zone, ngo.address, ngo.accepted_categories,
+                ngo.category_mask or 0, bool(ngo.has_pickup), zone_point(ngo.zone),
+                tuple(needs_by_ngo.get(ngo.id, ())),
+            )
+            for ngo in ngos
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, category=None, zone=None, within_km=None, pickup=False, has_needs=False):
+        """
+        [(DirectoryNGO, distance_km or None)] matching every given filter,
+        by name, or nearest first when `zone` is a known zone. NGOs in
+        unknown zones come last, and are dropped when `within_km` is set.
+        """
+        bit = self._bits.get(category.strip().lower(), 0) if category else 0
+        if category and not bit:
+            return []
+        point = zone_point(zone) if zone else None
+
+        results = []
+        for entry in self.entries:
+            if bit and not entry.category_mask & bit:
+                continue
+            if pickup and not entry.has_pickup:
+                continue
+            if has_needs and not entry.needs:
+                continue
+
+            distance = None
+            if point is not None:
+                if entry.point is not None:
+                    distance = math.hypot(entry.point[0] - point[0], entry.point[1] - point[1])
+                if within_km and (distance is None or distance > within_km):
+                    continue
+            results.append((entry, distance))
+
+        if point is not None:
+            # stable sort: ties and unlocated NGOs stay in name order
+            results.sort(key=lambda r: (r[1] is None, r[1] or 0.0))
+        return results
+
+
+def paginate(items, number: int, per_page: int = PER_PAGE) -> Page:
+    """Slice one page out of a result list; out-of-range pages are clamped."""
+    total = len(items)
+    pages = max(1, math.ceil(total / per_page))
+    number = min(max(1, number), pages)
+    start = (number - 1) * per_page
+    return Page(items[start:start + per_page], number, pages, total)
+
+
+# ---------------- snapshot cache ----------------
+
+_directories = {}  # shard key -> Directory
+_directory_lock = threading.Lock()
+
+
+def _build(open_set, version) -> Directory:
+    ngos = db.session.execute(
+        select(
+            NGO.id, NGO.name, NGO.zone, NGO.address, NGO.accepted_categories,
+            NGO.category_mask, NGO.has_pickup,
+        ).order_by(NGO.name.asc(), NGO.id.asc())
+    ).all()
+
+    needs = [
+        need
+        for need in NGONeed.query.filter(NGONeed.is_active == True).order_by(
+            NGONeed.created_at.desc(), NGONeed.id.desc()
+        )
+        if need.id in open_set
+    ]
+    categories = db.session.execute(select(Category.name, Category.bit).order_by(Category.bit)).all()
+    return Directory(ngos, needs, categories, open_set, version)
+
+
+def get_directory() -> Directory:
+    """
+    Directory snapshot of the current city shard. Rebuilt after any
+    process commits a change to NGOs or needs (checked through the shared
+    cache version every CACHE_VERSION_TTL seconds), and when the open-needs
+    set moves on; the new snapshot replaces the old one in a single
+    assignment, so readers always see one consistent version.
+    """
+    key = current_shard()
+    # read before the rows: a change committed in between only costs a rebuild
+    version = current_version(DIRECTORY)
+    open_set = open_needs()
+    directory = _directories.get(key)
+    if directory is not None and directory.version == version and directory.open_set is open_set:
+        return directory
+
+    # one build at a time
+    with _directory_lock:
+        directory = _directories.get(key)
+        if directory is None or directory.version != version or directory.open_set is not open_set:
+            directory = _directories[key] = _build(open_set, version)
+        return directory
+
+
+# ---------------- change tracking ----------------
+
+def _note_flush(session, _flush_context, _instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, NGONeed):
+            bump_version(session, DIRECTORY)
+            return
+        if isinstance(obj, NGO):
+            state = inspect(obj)
+            if obj in session.new or obj in session.deleted or any(
+                attr.history.has_changes() for attr in state.attrs if attr.key not in _IGNORED_NGO_COLUMNS
+            ):
+                bump_version(session, DIRECTORY)
+                return
+
+
+def _note_bulk_statement(orm_execute_state):
+    # set-based UPDATE/DELETE (bulk assignment, need sweeps) skip the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (NGO, NGONeed):
+            bump_version(orm_execute_state.session, DIRECTORY)
+
+
+def init_directory(app):
+    """Bump the donor directory's cache version whenever NGO or need data changes."""
+    listeners = (
+        ("before_flush", _note_flush),
+        ("do_orm_execute", _note_bulk_statement),
+    )
+    for name, fn in listeners:
+        if not event.contains(ShardedSession, name, fn):
+            event.listen(ShardedSession, name, fn)
@@ -1,3 +1,52 @@
+import sqlalchemy as sa
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 
-db = SQLAlchemy()
+
+# Tables that live in every city shard. Everything else (users) stays in
+# the main database, so one login works for every city.
+SHARDED_TABLES = frozenset({
+    "ngos", "ngo_needs", "donations", "donations_archive", "categories", "ngo_categories",
+    "donation_daily_stats", "donation_latency_daily", "donation_rollup_state", "rollup_watermarks",
+    "cache_versions",
+})
+
+
+class ShardedSession(Session):
+    """
+    Session that sends queries on sharded tables to the current request's
+    city shard (see use_shard()) and everything else to the normal bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _is_sharded(mapper, clause):
+            key = current_shard()
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_sharded(mapper, clause):
+    table = None
+    if mapper is not None:
+        table = sa.inspect(mapper).local_table
+    elif isinstance(clause, sa.Table):
+        table = clause
+    elif isinstance(clause, sa.sql.expression.UpdateBase) and isinstance(clause.table, sa.Table):
+        table = clause.table
+    return table is not None and table.name in SHARDED_TABLES
+
+
+def current_shard():
+    """Bind key of the city shard for this app context (None = the main database)."""
+    if not has_app_context():
+        return None
+    return g.get("shard_key")
+
+
+def set_current_shard(key):
+    g.shard_key = key
+
+
+db = SQLAlchemy(session_options={"class_": ShardedSession})
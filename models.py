@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
 
@@ -14,11 +14,11 @@ class User(db.Model):
     role = db.Column(db.String(20), default="donor")  # 'donor' or 'admin'
     # optional: rough area inside Karachi for donors, used for zone match
     zone = db.Column(db.String(50), nullable=True)
+    # picks the city shard holding this donor's donations
+    city = db.Column(db.String(100), nullable=True, default="Karachi")
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    donations = db.relationship("Donation", backref="donor", lazy=True)
-
     def set_password(self, password: str):
         self.password_hash = generate_password_hash(password)
 
@@ -26,6 +26,25 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
 
+# NGO <-> Category association. The (category_id, ngo_id) index makes
+# "which NGOs accept X" an index range scan instead of a table scan.
+ngo_categories = db.Table(
+    "ngo_categories",
+    db.Column("ngo_id", db.Integer, db.ForeignKey("ngos.id"), primary_key=True),
+    db.Column("category_id", db.Integer, db.ForeignKey("categories.id"), primary_key=True),
+    db.Index("ix_ngo_categories_category_ngo", "category_id", "ngo_id"),
+)
+
+
+class Category(db.Model):
+    __tablename__ = "categories"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)  # e.g. "Medical"
+    # bit position in NGO.category_mask, fixed once assigned
+    bit = db.Column(db.Integer, unique=True, nullable=False)
+
+
 class NGO(db.Model):
     __tablename__ = "ngos"
 
@@ -37,7 +56,13 @@ class NGO(db.Model):
     contact_email = db.Column(db.String(120), nullable=True)
     contact_phone = db.Column(db.String(50), nullable=True)
 
-    accepted_categories = db.Column(db.String(255), nullable=True)  # comma separated
+    # display copy only ("Food,Clothes"); `categories` is the source of truth.
+    # Always update through categories.set_ngo_categories() so all three stay in sync.
+    accepted_categories = db.Column(db.String(255), nullable=True)
+    categories = db.relationship("Category", secondary=ngo_categories, lazy="selectin",
+                                 backref=db.backref("ngos", lazy="dynamic"))
+    # OR of 1 << Category.bit for in-memory filtering without a join
+    category_mask = db.Column(db.Integer, nullable=False, default=0)
     is_verified = db.Column(db.Boolean, default=True)
     has_pickup = db.Column(db.Boolean, default=False)
 
@@ -62,6 +87,10 @@ class NGONeed(db.Model):
     qty_fulfilled = db.Column(db.Integer, nullable=False, default=0)
 
     is_active = db.Column(db.Boolean, default=True)
+    # optional deadline; `flask sweep-needs` deactivates needs past it
+    expires_at = db.Column(db.DateTime, nullable=True)
+    # why the need was closed automatically: "fulfilled" / "expired" (None = open or closed by an admin)
+    closed_reason = db.Column(db.String(20), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -72,6 +101,11 @@ class NGONeed(db.Model):
         remaining = (self.qty_required or 0) - (self.qty_fulfilled or 0)
         return max(0, remaining)
 
+    @property
+    def deadline(self):
+        """Last day the need is open (expires_at is the midnight after it)."""
+        return (self.expires_at - timedelta(days=1)).date() if self.expires_at else None
+
 
 class Donation(db.Model):
     __tablename__ = "donations"
@@ -92,13 +126,112 @@ class Donation(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     assigned_at = db.Column(db.DateTime, nullable=True)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # indexed: the rollup catch-up job scans by updated_at watermark
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     rejected_reason = db.Column(db.Text, nullable=True)
     rejected_at = db.Column(db.DateTime, nullable=True)
 
-    donor_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    # users live only in the main database, so no foreign key across shards
+    donor_id = db.Column(db.Integer, nullable=False)
     ngo_id = db.Column(db.Integer, db.ForeignKey("ngos.id"), nullable=True)
     need_id = db.Column(db.Integer, db.ForeignKey("ngo_needs.id"), nullable=True)
     need = db.relationship("NGONeed", backref="donations", lazy=True)
 
 
+class ArchivedDonation(db.Model):
+    """
+    Cold storage for donations closed (assigned/rejected) long ago.
+    Same columns as Donation plus archived_at; rows are moved here by
+    `flask archive-donations` and keep their original id and tracking_id.
+    """
+    __tablename__ = "donations_archive"
+
+    id = db.Column(db.Integer, primary_key=True)
+    tracking_id = db.Column(db.String(20), unique=True, nullable=False)
+
+    item_name = db.Column(db.String(200), nullable=False)
+    category_manual = db.Column(db.String(100), nullable=True)
+    quantity = db.Column(db.Integer, nullable=True)
+    condition = db.Column(db.String(50), nullable=True)
+    description = db.Column(db.Text, nullable=False)
+
+    donor_zone = db.Column(db.String(50), nullable=True)
+
+    status = db.Column(db.String(20), nullable=False)
+
+    created_at = db.Column(db.DateTime, nullable=True)
+    assigned_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    rejected_reason = db.Column(db.Text, nullable=True)
+    rejected_at = db.Column(db.DateTime, nullable=True)
+
+    # users live only in the main database, so no foreign key across shards
+    donor_id = db.Column(db.Integer, nullable=False)
+    ngo_id = db.Column(db.Integer, db.ForeignKey("ngos.id"), nullable=True)
+    need_id = db.Column(db.Integer, db.ForeignKey("ngo_needs.id"), nullable=True)
+
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    ngo = db.relationship("NGO", lazy=True, viewonly=True)
+    need = db.relationship("NGONeed", lazy=True, viewonly=True)
+
+
+# ---------------- reporting rollups (maintained by rollups.py) ----------------
+
+class DonationDailyStat(db.Model):
+    """Donation counts per day x zone x category x NGO (ngo_id 0 = none)."""
+    __tablename__ = "donation_daily_stats"
+
+    day = db.Column(db.Date, primary_key=True)
+    zone = db.Column(db.String(50), primary_key=True, default="")
+    category = db.Column(db.String(100), primary_key=True, default="")
+    ngo_id = db.Column(db.Integer, primary_key=True, default=0)
+
+    created = db.Column(db.Integer, nullable=False, default=0)
+    assigned = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DonationLatencyDaily(db.Model):
+    """
+    Histogram of created -> assigned/rejected time per closing day.
+    Bucket b holds durations of roughly 2**(b/4) minutes, so medians
+    can be read back within about 10%.
+    """
+    __tablename__ = "donation_latency_daily"
+
+    day = db.Column(db.Date, primary_key=True)
+    outcome = db.Column(db.String(20), primary_key=True)  # "assigned" or "rejected"
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DonationRollupState(db.Model):
+    """What each donation currently contributes to the rollups, so changes can be diffed."""
+    __tablename__ = "donation_rollup_state"
+
+    donation_id = db.Column(db.Integer, primary_key=True)
+    created_day = db.Column(db.Date, nullable=True)
+    zone = db.Column(db.String(50), nullable=False, default="")
+    category = db.Column(db.String(100), nullable=False, default="")
+    outcome = db.Column(db.String(20), nullable=True)
+    closed_day = db.Column(db.Date, nullable=True)
+    ngo_id = db.Column(db.Integer, nullable=False, default=0)
+    latency_bucket = db.Column(db.Integer, nullable=True)
+
+
+class RollupWatermark(db.Model):
+    __tablename__ = "rollup_watermarks"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.DateTime, nullable=True)
+
+
+# ---------------- in-process caches (see cache_versions.py) ----------------
+
+class CacheVersion(db.Model):
+    """Bumped by every commit that changes the data behind a cache, so all processes notice."""
+    __tablename__ = "cache_versions"
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,184 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import and_, event, inspect, or_, select, update
+
+from cache_versions import OPEN_NEEDS, bump_version, current_version
+from extensions import db, ShardedSession
+from models import NGONeed
+from shards import current_shard
+
+# NGONeed.closed_reason values for needs the lifecycle closed on its own
+FULFILLED = "fulfilled"
+EXPIRED = "expired"
+
+# columns whose change can add a need to or drop it from the open set
+_STATE_COLUMNS = ("is_active", "expires_at", "ngo_id")
+
+
+class OpenNeeds:
+    """
+    Immutable snapshot of the open needs of one shard: ids of active,
+    unexpired needs, newest first, overall and per NGO. Quantities are not
+    stored, so assignments that do not close a need leave it untouched.
+    """
+
+    def __init__(self, rows, now, version):
+        self.version = version  # cache version the rows were read under
+        self.ids = tuple(row.id for row in rows)
+        self._ids = frozenset(self.ids)
+        self.by_ngo = {}
+        for row in rows:
+            self.by_ngo.setdefault(row.ngo_id, []).append(row.id)
+        self.by_ngo = {ngo_id: tuple(ids) for ngo_id, ids in self.by_ngo.items()}
+
+        # the snapshot goes stale by itself once the earliest deadline passes
+        deadlines = [row.expires_at for row in rows if row.expires_at]
+        self.valid_until = min(deadlines) if deadlines else None
+        self.built_at = now
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, need_id):
+        return need_id in self._ids
+
+    def latest_for(self, ngo_id):
+        """Id of an NGO's newest open need, or None."""
+        ids = self.by_ngo.get(ngo_id)
+        return ids[0] if ids else None
+
+    def is_current(self, version, now) -> bool:
+        return version == self.version and (self.valid_until is None or now < self.valid_until)
+
+
+_snapshots = {}  # shard key -> OpenNeeds
+_snapshot_lock = threading.Lock()
+
+
+def open_needs() -> OpenNeeds:
+    """
+    Open needs of the current city shard. Needs past their deadline are
+    left out even before the sweep has deactivated them. The snapshot is
+    rebuilt once any process commits a change to the open set (checked
+    through the shared cache version every CACHE_VERSION_TTL seconds).
+    """
+    key = current_shard()
+    now = datetime.utcnow()
+    # read before the rows: a change committed in between only costs a rebuild
+    version = current_version(OPEN_NEEDS)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot.is_current(version, now):
+        return snapshot
+
+    rows = db.session.execute(
+        select(NGONeed.id, NGONeed.ngo_id, NGONeed.expires_at)
+        .where(is_open(now))
+        .order_by(NGONeed.created_at.desc(), NGONeed.id.desc())
+    ).all()
+    snapshot = OpenNeeds(rows, now, version)
+
+    with _snapshot_lock:
+        # a concurrent build that saw a newer version wins
+        current = _snapshots.get(key)
+        if current is None or current.version <= version:
+            _snapshots[key] = snapshot
+    return snapshot
+
+
+def is_open(now):
+    """SQL condition for needs that are open at `now`: active and not past their deadline."""
+    return and_(NGONeed.is_active == True, or_(NGONeed.expires_at.is_(None), NGONeed.expires_at > now))
+
+
+def _mark_changed(session):
+    bump_version(session, OPEN_NEEDS)
+
+
+# ---------------- lifecycle ----------------
+
+def close_fulfilled_needs(need_ids=None) -> int:
+    """
+    Deactivate active needs whose fulfilled quantity has reached the
+    required quantity, limited to `need_ids` if given. One set-based
+    UPDATE; does not commit. Returns the number of needs closed.
+    """
+    stmt = update(NGONeed).where(
+        NGONeed.is_active == True,
+        NGONeed.qty_required > 0,
+        NGONeed.qty_fulfilled >= NGONeed.qty_required,
+    )
+    if need_ids is not None:
+        stmt = stmt.where(NGONeed.id.in_(list(need_ids)))
+
+    result = db.session.execute(
+        stmt.values(is_active=False, closed_reason=FULFILLED, updated_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False},
+    )
+    if result.rowcount:
+        _mark_changed(db.session)
+    return result.rowcount
+
+
+def expire_needs(now=None) -> int:
+    """Deactivate active needs whose deadline has passed. Does not commit."""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(NGONeed)
+        .where(NGONeed.is_active == True, NGONeed.expires_at <= now)
+        .values(is_active=False, closed_reason=EXPIRED, updated_at=now),
+        execution_options={"synchronize_session": False},
+    )
+    if result.rowcount:
+        _mark_changed(db.session)
+    return result.rowcount
+
+
+def sweep_needs() -> int:
+    """
+    Scheduled sweep for the current shard: expire needs past their
+    deadline. Fulfilled needs close as they are assigned, so the sweep
+    leaves them alone; a need an admin re-enabled stays open. Commits.
+    Returns the number of needs expired.
+    """
+    expired = expire_needs()
+    db.session.commit()
+    return expired
+
+
+# ---------------- session hooks ----------------
+
+def _close_on_flush(session, _flush_context, _instances):
+    """
+    Close needs fulfilled through the ORM (single assignments) in the same
+    flush, and bump the open-needs version if the open set changed. Only
+    needs whose fulfilled quantity changed in this flush are closed, so an
+    admin can still re-enable a fulfilled need by hand.
+    """
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, NGONeed):
+            continue
+        state = inspect(obj)
+        if (
+            obj.is_active
+            and (obj.qty_required or 0) > 0
+            and obj.qty_remaining == 0
+            and (obj in session.new or state.attrs.qty_fulfilled.history.has_changes())
+        ):
+            obj.is_active = False
+            obj.closed_reason = FULFILLED
+
+        if obj in session.new:
+            if obj.is_active is not False:
+                _mark_changed(session)
+        elif any(state.attrs[name].history.has_changes() for name in _STATE_COLUMNS):
+            _mark_changed(session)
+
+    if any(isinstance(obj, NGONeed) for obj in session.deleted):
+        _mark_changed(session)
+
+
+def init_needs(app):
+    """Run the need lifecycle on every flush; it also bumps the open-needs cache version."""
+    if not event.contains(ShardedSession, "before_flush", _close_on_flush):
+        event.listen(ShardedSession, "before_flush", _close_on_flush)
@@ -0,0 +1,293 @@
+import collections
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StackSampler:
+    """
+    Tiny sampling profiler: a daemon thread snapshots one thread's Python
+    stack every `interval` seconds and counts identical stacks. The profiled
+    thread runs unmodified (no tracing hooks), so overhead stays low.
+    Output is the "folded" format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def samples(self) -> int:
+        return sum(self.counts.values())
+
+
+class CallProfiler:
+    """
+    cProfile for the current thread. Records every call, so it also
+    covers requests shorter than a few sampling intervals, at the cost of
+    slowing the profiled request down. folded() rebuilds stacks from the
+    caller/callee graph, splitting a function's time between its callers
+    in proportion to the time each call edge took; weights are microseconds.
+    """
+
+    MAX_DEPTH = 64
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        self.profile.disable()
+
+    def folded(self) -> str:
+        stats = pstats.Stats(self.profile).stats
+
+        callees = collections.defaultdict(dict)
+        for func, (_cc, _nc, _tt, _ct, callers) in stats.items():
+            for caller, edge in callers.items():
+                if caller in stats:
+                    callees[caller][func] = edge[3]
+
+        counts = collections.Counter()
+
+        def walk(func, path, seconds):
+            _cc, _nc, tt, ct, _callers = stats[func]
+            path = path + (func,)
+            share = seconds / ct if ct else 0.0
+            counts[";".join(_label(f) for f in path)] += tt * share
+            if len(path) >= self.MAX_DEPTH:
+                return
+            for callee, edge_ct in callees[func].items():
+                if callee not in path and edge_ct * share >= 1e-6:
+                    walk(callee, path, edge_ct * share)
+
+        for func, (_cc, _nc, _tt, ct, callers) in stats.items():
+            if not any(caller in stats for caller in callers):
+                walk(func, (), ct)
+
+        return "".join(
+            f"{stack} {round(seconds * 1e6)}\n"
+            for stack, seconds in counts.most_common()
+            if seconds >= 1e-6
+        )
+
+    def samples(self) -> int:
+        return pstats.Stats(self.profile).total_calls
+
+
+def _label(func) -> str:
+    filename, firstlineno, name = func
+    if filename == "~":  # built-in
+        return name
+    return f"{name} ({os.path.basename(filename)}:{firstlineno})"
+
+
+def _start_profiler(trigger: str, interval_ms: float):
+    """
+    cProfile for manual profiles, which an admin asks for on purpose and
+    which are often short requests; the low-overhead sampler otherwise.
+    The sampler never samples faster than the interpreter's thread switch
+    interval: the request thread only lets go of the GIL that often, so
+    shorter intervals return the same stack repeatedly or nothing at all.
+    """
+    if trigger == "manual":
+        try:
+            return CallProfiler().start()
+        except ValueError:  # another profiler is active in this process
+            pass
+    interval = max(interval_ms / 1000, sys.getswitchinterval())
+    return StackSampler(threading.get_ident(), interval).start()
+
+
+# ---------------- SQL stats ----------------
+# Timings live on the execution context, so nested or failed statements
+# cannot unbalance them; nothing is recorded outside a profiled request.
+
+def _sql_start(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _active_profile() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _sql_end(conn, cursor, statement, parameters, context, executemany):
+    _record_sql(context)
+
+
+def _sql_error(exception_context):
+    _record_sql(exception_context.execution_context)
+
+
+def _record_sql(context):
+    started = getattr(context, "_profile_started", None)
+    if started is None:
+        return
+    del context._profile_started
+    profile = _active_profile()
+    if profile is not None:
+        profile["sql_count"] += 1
+        profile["sql_ms"] += (time.perf_counter() - started) * 1000
+
+
+def _active_profile():
+    try:
+        return g.get("_profile")
+    except RuntimeError:  # outside an app context (CLI scripts, other threads)
+        return None
+
+
+# ---------------- storage ----------------
+
+def list_profiles(profile_dir: str, limit: int = 50) -> list:
+    """Metadata of the most recent profiles, newest first."""
+    if not os.path.isdir(profile_dir):
+        return []
+    names = sorted((n for n in os.listdir(profile_dir) if n.endswith(".json")), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        with open(os.path.join(profile_dir, name)) as f:
+            profiles.append(json.load(f))
+    return profiles
+
+
+def _prune(profile_dir: str, keep: int):
+    names = sorted(n for n in os.listdir(profile_dir) if n.endswith(".json"))
+    for name in names[:-keep] if keep > 0 else names:
+        base = name[:-len(".json")]
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(profile_dir, base + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def _save(profile_dir: str, keep: int, profile: dict, profiler):
+    os.makedirs(profile_dir, exist_ok=True)
+
+    endpoint = request.endpoint or "unknown"
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{endpoint}"
+    meta = {
+        "name": name,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "route": request.url_rule.rule if request.url_rule else None,
+        "endpoint": endpoint,
+        "status": profile["status"],
+        "duration_ms": round((time.perf_counter() - profile["started"]) * 1000, 2),
+        "sql_count": profile["sql_count"],
+        "sql_ms": round(profile["sql_ms"], 2),
+        "samples": profiler.samples(),
+        "trigger": profile["trigger"],
+        "profiler": "cprofile" if isinstance(profiler, CallProfiler) else "sampler",
+    }
+
+    with open(os.path.join(profile_dir, name + ".folded"), "w") as f:
+        f.write(profiler.folded())
+    with open(os.path.join(profile_dir, name + ".json"), "w") as f:
+        json.dump(meta, f)
+
+    _prune(profile_dir, keep)
+
+
+# ---------------- wiring ----------------
+
+def init_profiling(app, current_user):
+    """
+    Profile a request when
+      - an admin sends `X-Profile: 1` or `?profile=1`, or
+      - it is picked by background sampling (PROFILE_SAMPLE_RATE, 0..1).
+    Each profile is saved to PROFILE_DIR as <name>.folded (flamegraph input)
+    plus <name>.json (route, timing and SQL stats).
+    """
+    listeners = (
+        ("before_cursor_execute", _sql_start),
+        ("after_cursor_execute", _sql_end),
+        ("handle_error", _sql_error),
+    )
+    for name, fn in listeners:
+        if not event.contains(Engine, name, fn):
+            event.listen(Engine, name, fn)
+
+    def wants_profile():
+        if request.endpoint == "static":
+            return None
+
+        if request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1":
+            user = current_user()
+            if user and user.role == "admin":
+                return "manual"
+
+        rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+        if rate > 0 and random.random() < rate:
+            return "sampled"
+        return None
+
+    @app.before_request
+    def start_profiler():
+        trigger = wants_profile()
+        if not trigger:
+            return
+        g._profile = {
+            "trigger": trigger,
+            "started": time.perf_counter(),
+            "sql_count": 0,
+            "sql_ms": 0.0,
+        }
+        g._profile_sampler = _start_profiler(trigger, app.config.get("PROFILE_INTERVAL_MS", 5))
+
+    @app.after_request
+    def note_profiled_response(response):
+        profile = g.get("_profile")
+        if profile is not None:
+            profile["status"] = response.status_code
+        return response
+
+    @app.teardown_request
+    def save_profile(_exc):
+        # Teardown runs once the body has been rendered, also for streamed
+        # templates (stream_with_context keeps the request open until then),
+        # so their rendering and SQL are part of the profile. after_request
+        # is skipped for unhandled errors: stop those, but do not save them.
+        profiler = g.pop("_profile_sampler", None)
+        if profiler is None:
+            return
+        profiler.stop()
+        profile = g.pop("_profile")
+        if "status" in profile:
+            _save(app.config["PROFILE_DIR"], app.config.get("PROFILE_KEEP", 200), profile, profiler)
@@ -0,0 +1,295 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, tuple_, update
+
+from extensions import db
+from models import (
+    Donation, DonationDailyStat, DonationLatencyDaily, DonationRollupState, RollupWatermark,
+)
+
+WATERMARK = "donations"
+
+# Rows committed slightly out of updated_at order (long transactions, clock
+# skew between workers) are still picked up: every run re-reads this much
+# history. Re-processing is free because contributions are diffed.
+OVERLAP = timedelta(minutes=5)
+
+BATCH_SIZE = 1000
+
+
+# ---------------- latency buckets ----------------
+
+def latency_bucket(minutes: float) -> int:
+    """Quarter-octave bucket: 4 buckets per doubling of the duration."""
+    return int(math.floor(4 * math.log2(max(minutes, 0) + 1)))
+
+
+def bucket_minutes(bucket: int) -> float:
+    """Representative duration (geometric middle) of a bucket, in minutes."""
+    low = 2 ** (bucket / 4) - 1
+    high = 2 ** ((bucket + 1) / 4) - 1
+    return math.sqrt(max(low, 0.0) * high) if low > 0 else high / 2
+
+
+# ---------------- contributions ----------------
+
+def _state_for(donation) -> dict:
+    """What a donation should contribute to the rollups right now."""
+    state = {
+        "created_day": donation.created_at.date() if donation.created_at else None,
+        "zone": donation.donor_zone or "",
+        "category": donation.category_manual or "",
+        "outcome": None,
+        "closed_day": None,
+        "ngo_id": 0,
+        "latency_bucket": None,
+    }
+
+    closed_at = None
+    if donation.status == "assigned" and donation.assigned_at:
+        closed_at = donation.assigned_at
+        state["ngo_id"] = donation.ngo_id or 0
+    elif donation.status == "rejected" and donation.rejected_at:
+        closed_at = donation.rejected_at
+
+    if closed_at:
+        state["outcome"] = donation.status
+        state["closed_day"] = closed_at.date()
+        if donation.created_at:
+            minutes = (closed_at - donation.created_at).total_seconds() / 60
+            state["latency_bucket"] = latency_bucket(minutes)
+    return state
+
+
+def _contributions(state, sign, stats, latency):
+    """Add (sign=+1) or remove (sign=-1) one donation's state from the delta maps."""
+    if state is None:
+        return
+    if state["created_day"]:
+        stats[(state["created_day"], state["zone"], state["category"], 0)]["created"] += sign
+    if state["outcome"]:
+        ngo_id = state["ngo_id"] if state["outcome"] == "assigned" else 0
+        stats[(state["closed_day"], state["zone"], state["category"], ngo_id)][state["outcome"]] += sign
+        if state["latency_bucket"] is not None:
+            latency[(state["closed_day"], state["outcome"], state["latency_bucket"])] += sign
+
+
+def _state_dict(row) -> dict:
+    return {
+        "created_day": row.created_day,
+        "zone": row.zone,
+        "category": row.category,
+        "outcome": row.outcome,
+        "closed_day": row.closed_day,
+        "ngo_id": row.ngo_id,
+        "latency_bucket": row.latency_bucket,
+    }
+
+
+def _apply_deltas(stats, latency):
+    stats = {k: v for k, v in stats.items() if any(v.values())}
+    if stats:
+        existing = {
+            (r.day, r.zone, r.category, r.ngo_id): r
+            for r in DonationDailyStat.query.filter(
+                tuple_(DonationDailyStat.day, DonationDailyStat.zone,
+                       DonationDailyStat.category, DonationDailyStat.ngo_id).in_(list(stats))
+            )
+        }
+        for key, delta in stats.items():
+            row = existing.get(key)
+            if row is None:
+                day, zone, category, ngo_id = key
+                row = DonationDailyStat(day=day, zone=zone, category=category, ngo_id=ngo_id,
+                                        created=0, assigned=0, rejected=0)
+                db.session.add(row)
+            row.created += delta["created"]
+            row.assigned += delta["assigned"]
+            row.rejected += delta["rejected"]
+
+    latency = {k: v for k, v in latency.items() if v}
+    if latency:
+        existing = {
+            (r.day, r.outcome, r.bucket): r
+            for r in DonationLatencyDaily.query.filter(
+                tuple_(DonationLatencyDaily.day, DonationLatencyDaily.outcome,
+                       DonationLatencyDaily.bucket).in_(list(latency))
+            )
+        }
+        for key, delta in latency.items():
+            row = existing.get(key)
+            if row is None:
+                day, outcome, bucket = key
+                row = DonationLatencyDaily(day=day, outcome=outcome, bucket=bucket, count=0)
+                db.session.add(row)
+            row.count += delta
+
+
+def _process(donations):
+    ids = [d.id for d in donations]
+    old_states = {
+        s.donation_id: s
+        for s in DonationRollupState.query.filter(DonationRollupState.donation_id.in_(ids))
+    }
+
+    stats = defaultdict(lambda: {"created": 0, "assigned": 0, "rejected": 0})
+    latency = defaultdict(int)
+
+    for donation in donations:
+        new = _state_for(donation)
+        row = old_states.get(donation.id)
+        old = _state_dict(row) if row else None
+        if old == new:
+            continue
+
+        _contributions(old, -1, stats, latency)
+        _contributions(new, +1, stats, latency)
+
+        if row is None:
+            row = DonationRollupState(donation_id=donation.id)
+            db.session.add(row)
+        for key, value in new.items():
+            setattr(row, key, value)
+
+    _apply_deltas(stats, latency)
+
+
+# ---------------- public API ----------------
+
+def _lock_watermark():
+    """
+    Take a write lock on the watermark row for the rest of the transaction,
+    so concurrent refreshes (workers, cron) serialise instead of double
+    counting. Returns the watermark, or None if there is none yet.
+    """
+    # no-op UPDATE = row lock on Postgres, database write lock on SQLite
+    result = db.session.execute(
+        update(RollupWatermark)
+        .where(RollupWatermark.name == WATERMARK)
+        .values(value=RollupWatermark.value)
+    )
+    if not result.rowcount:
+        return None
+    watermark = db.session.get(RollupWatermark, WATERMARK)
+    db.session.refresh(watermark)
+    return watermark
+
+
+def refresh_rollups() -> int:
+    """
+    Fold every donation changed since the last watermark into the daily
+    rollups and advance the watermark; used by `flask refresh-rollups` and
+    before archiving. Runs in one transaction under the watermark lock.
+    Returns the number of donations examined.
+    """
+    watermark = _lock_watermark()
+    if watermark is None:
+        watermark = RollupWatermark(name=WATERMARK, value=None)
+        db.session.add(watermark)
+        db.session.flush()
+
+    since = watermark.value - OVERLAP if watermark.value else None
+    high = watermark.value
+    examined = 0
+    last_id = 0
+
+    while True:
+        query = Donation.query.filter(Donation.id > last_id)
+        if since is not None:
+            query = query.filter(Donation.updated_at >= since)
+        batch = query.order_by(Donation.id.asc()).limit(BATCH_SIZE).all()
+        if not batch:
+            break
+
+        _process(batch)
+        examined += len(batch)
+        last_id = batch[-1].id
+        batch_high = max((d.updated_at for d in batch if d.updated_at), default=None)
+        if batch_high and (high is None or batch_high > high):
+            high = batch_high
+
+    watermark.value = high
+    db.session.commit()
+    return examined
+
+
+def refresh_rollups_for(donation_ids) -> int:
+    """
+    Fold just these donations into the rollups, right after a request
+    changed them. The watermark is locked but not moved: the next
+    `flask refresh-rollups` re-reads them at no cost, since contributions
+    are diffed. Before the first full refresh there is nothing to keep
+    current, so this does nothing. Returns the number of donations examined.
+    """
+    ids = sorted({int(i) for i in donation_ids})
+    if not ids or _lock_watermark() is None:
+        db.session.rollback()
+        return 0
+
+    examined = 0
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = Donation.query.filter(Donation.id.in_(ids[start:start + BATCH_SIZE])).all()
+        _process(batch)
+        examined += len(batch)
+
+    db.session.commit()
+    return examined
+
+
+def report(days: int = 30) -> dict:
+    """
+    Everything the admin report page shows, read from the rollup tables only:
+    per-day totals, breakdowns by zone / category / NGO and median time to
+    assignment and rejection over the last `days` days.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    stat = DonationDailyStat
+    in_range = stat.day >= since
+
+    def grouped(column):
+        return (
+            db.session.query(
+                column,
+                func.sum(stat.created), func.sum(stat.assigned), func.sum(stat.rejected),
+            )
+            .filter(in_range)
+            .group_by(column)
+            .order_by(column)
+            .all()
+        )
+
+    by_ngo = [row for row in grouped(stat.ngo_id) if row[0]]
+
+    medians = {}
+    for outcome in ("assigned", "rejected"):
+        buckets = (
+            db.session.query(DonationLatencyDaily.bucket, func.sum(DonationLatencyDaily.count))
+            .filter(DonationLatencyDaily.day >= since, DonationLatencyDaily.outcome == outcome)
+            .group_by(DonationLatencyDaily.bucket)
+            .order_by(DonationLatencyDaily.bucket)
+            .all()
+        )
+        medians[outcome] = _median_minutes(buckets)
+
+    return {
+        "since": since,
+        "by_day": grouped(stat.day),
+        "by_zone": grouped(stat.zone),
+        "by_category": grouped(stat.category),
+        "by_ngo": by_ngo,
+        "median_minutes": medians,
+    }
+
+
+def _median_minutes(buckets):
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen * 2 >= total:
+            return bucket_minutes(bucket)
+    return None
@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from flask import current_app
+
+from extensions import db, SHARDED_TABLES, current_shard, set_current_shard
+
+
+# ---------------- shard map ----------------
+
+def city_shards() -> dict:
+    """{city: bind key}; None is the main database."""
+    return current_app.config["CITY_SHARDS"]
+
+
+def shard_keys() -> list:
+    return list(dict.fromkeys(city_shards().values()))
+
+
+def shard_for_city(city):
+    """Bind key for a city; unknown or empty cities go to the default city's shard."""
+    shards = city_shards()
+    for name, key in shards.items():
+        if city and name.lower() == city.strip().lower():
+            return key
+    return shards[current_app.config["DEFAULT_CITY"]]
+
+
+def city_for_shard(key) -> str:
+    for name, shard in city_shards().items():
+        if shard == key:
+            return name
+    return current_app.config["DEFAULT_CITY"]
+
+
+def shard_code(key) -> str:
+    """Short code embedded in tracking IDs; the main database has none."""
+    return "" if key is None else key[:3].upper()
+
+
+def tracking_prefix(key) -> str:
+    """'DN-' for the main database, 'DN-LAH-' for the Lahore shard."""
+    code = shard_code(key)
+    return f"DN-{code}-" if code else "DN-"
+
+
+def shard_for_tracking_id(tracking_id):
+    """
+    DN-LAH-001 -> Lahore's bind key. IDs without a known code (DN-001,
+    including every ID issued before sharding) belong to the main database.
+    """
+    parts = (tracking_id or "").strip().upper().split("-")
+    if len(parts) == 3:
+        for key in shard_keys():
+            if key is not None and shard_code(key) == parts[1]:
+                return key
+    return None
+
+
+# ---------------- switching shards ----------------
+
+@contextmanager
+def use_shard(key):
+    """
+    Route sharded tables to `key` inside the block. The session is closed
+    when switching so objects with the same primary key from different
+    shards never meet in one identity map; commit before switching.
+    """
+    previous = current_shard()
+    if key == previous:
+        yield
+        return
+
+    db.session.close()
+    set_current_shard(key)
+    try:
+        yield
+    finally:
+        db.session.close()
+        set_current_shard(previous)
+
+
+def run_on_all_shards(fn) -> dict:
+    """
+    Call fn() once per shard, in parallel, each in its own app context and
+    session. Returns {city: result}.
+    """
+    app = current_app._get_current_object()
+
+    def run(key):
+        with app.app_context():
+            set_current_shard(key)
+            try:
+                return fn()
+            finally:
+                db.session.remove()
+
+    keys = shard_keys()
+    if len(keys) == 1:
+        with use_shard(keys[0]):
+            return {city_for_shard(keys[0]): fn()}
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+        results = list(pool.map(run, keys))
+    return {city_for_shard(key): result for key, result in zip(keys, results)}
+
+
+def create_shard_tables():
+    """
+    Create all tables in the main database and the sharded ones in every
+    other shard. Indexes added to existing tables later are created too.
+    """
+    db.create_all()
+    tables = [t for t in db.metadata.sorted_tables if t.name in SHARDED_TABLES]
+    for key in shard_keys():
+        engine = db.engines[key] if key is not None else db.engine
+        if key is not None:
+            db.metadata.create_all(engine, tables=tables)
+        for table in tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+
+
+def add_column_if_missing(engine, table: str, column: str, ddl: str):
+    """
+    Tiny forward-only migration for SQLite, which cannot add columns via
+    create_all(). Tables that do not exist yet are left to create_all().
+    Returns True if the column was added.
+    """
+    inspector = sa.inspect(engine)
+    if not inspector.has_table(table):
+        return False
+    columns = {c["name"] for c in inspector.get_columns(table)}
+    if column in columns:
+        return False
+    with engine.begin() as conn:
+        conn.execute(sa.text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+    return True
@@ -0,0 +1,349 @@
+import math
+import re
+import threading
+from difflib import get_close_matches
+from functools import lru_cache
+
+from flask import has_app_context
+from sqlalchemy import event, inspect
+
+from cache_versions import NGO_INDEX, bump_version, current_version
+from categories import category_bit
+from extensions import ShardedSession
+from shards import city_for_shard, current_shard
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, batch queries fall back to plain Python
+    np = None
+
+
+# Approximate centroids (lat, lon) of Karachi areas used for zone matching.
+ZONE_CENTROIDS = {
+    "Azizabad": (24.9200, 67.0600),
+    "Bahadurabad": (24.8800, 67.0680),
+    "Baldia": (24.9400, 66.9600),
+    "Bin Qasim": (24.8000, 67.3300),
+    "Civil Lines": (24.8590, 67.0100),
+    "Clifton": (24.8150, 67.0300),
+    "DHA": (24.8000, 67.0650),
+    "Federal B Area": (24.9300, 67.0800),
+    "Garden": (24.8750, 67.0150),
+    "Gulberg": (24.9350, 67.0700),
+    "Gulistan-e-Johar": (24.9150, 67.1300),
+    "Gulshan-e-Hadid": (24.8700, 67.3600),
+    "Gulshan-e-Iqbal": (24.9200, 67.0930),
+    "Gulshan-e-Maymar": (25.0100, 67.1300),
+    "JPMC": (24.8510, 67.0440),
+    "Jamshed Road": (24.8800, 67.0400),
+    "Karsaz": (24.8850, 67.0900),
+    "Kashmir Road": (24.8800, 67.0500),
+    "Keamari": (24.8200, 66.9700),
+    "Korangi": (24.8300, 67.1300),
+    "Landhi": (24.8500, 67.2000),
+    "Liaquatabad": (24.9050, 67.0450),
+    "Lyari": (24.8700, 66.9900),
+    "Malir": (24.8950, 67.2000),
+    "Malir Cantt": (24.9500, 67.2000),
+    "Mehmoodabad": (24.8550, 67.0800),
+    "Mithadar": (24.8530, 66.9960),
+    "Model Colony": (24.8900, 67.1850),
+    "Nazimabad": (24.9100, 67.0300),
+    "New Karachi": (25.0000, 67.0700),
+    "North Karachi": (24.9900, 67.0600),
+    "North Nazimabad": (24.9400, 67.0400),
+    "Orangi": (24.9500, 66.9900),
+    "PECHS": (24.8700, 67.0600),
+    "Saddar": (24.8560, 67.0270),
+    "Safoora": (24.9350, 67.1600),
+    "Scheme 33": (24.9500, 67.1300),
+    "Shah Faisal Colony": (24.8800, 67.1600),
+    "Shahrah-e-Faisal": (24.8700, 67.0900),
+    "SITE": (24.9000, 66.9900),
+    "Surjani Town": (25.0300, 67.0500),
+    "Tariq Road": (24.8720, 67.0620),
+}
+
+# Common short forms / spellings -> canonical gazetteer name
+ZONE_ALIASES = {
+    "gulshan": "Gulshan-e-Iqbal",
+    "johar": "Gulistan-e-Johar",
+    "jauhar": "Gulistan-e-Johar",
+    "gulistanejauhar": "Gulistan-e-Johar",
+    "defence": "DHA",
+    "defense": "DHA",
+    "fbarea": "Federal B Area",
+    "fedralbarea": "Federal B Area",
+    "malircantonment": "Malir Cantt",
+    "kemari": "Keamari",
+    "sharaefaisal": "Shahrah-e-Faisal",
+    "shahraefaisal": "Shahrah-e-Faisal",
+    "tariqrd": "Tariq Road",
+    "maymar": "Gulshan-e-Maymar",
+    "hadid": "Gulshan-e-Hadid",
+    "nnazimabad": "North Nazimabad",
+    "nkarachi": "North Karachi",
+}
+
+# Gazetteers per city: (centroids, aliases). Cities without one get no
+# zone matching and no distances, rather than Karachi's ("Gulberg" and
+# "DHA" exist in Lahore too).
+GAZETTEERS = {
+    "Karachi": (ZONE_CENTROIDS, ZONE_ALIASES),
+}
+
+# Equirectangular projection: degrees -> km on a flat plane around each
+# city's mean latitude. Error is well under 1% across a city, which is
+# plenty for ranking.
+_KM_PER_DEG_LAT = 110.57
+
+GRID_CELL_KM = 3.0
+
+
+def _key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _canonical_by_key(city):
+    centroids, aliases = GAZETTEERS[city]
+    canonical = {_key(name): name for name in centroids}
+    canonical.update(aliases)
+    return canonical
+
+
+_CANONICAL_BY_KEY = {city: _canonical_by_key(city) for city in GAZETTEERS}
+_KM_PER_DEG_LON = {
+    city: 111.32 * math.cos(math.radians(sum(lat for lat, _ in centroids.values()) / len(centroids)))
+    for city, (centroids, _aliases) in GAZETTEERS.items()
+}
+
+
+def _current_city():
+    """City of the current shard; the default city outside a request or CLI context."""
+    if not has_app_context():
+        return next(iter(GAZETTEERS))
+    return city_for_shard(current_shard())
+
+
+def has_gazetteer(city=None) -> bool:
+    """Whether zones of `city` (default: the current shard's) can be located."""
+    return (city or _current_city()) in GAZETTEERS
+
+
+def zone_names(city=None) -> list:
+    """Known zone names of a city, sorted; empty without a gazetteer."""
+    city = city or _current_city()
+    return sorted(GAZETTEERS[city][0]) if city in GAZETTEERS else []
+
+
+def normalize_zone(name, city=None):
+    """
+    Map free-text zone input ("gulshan e iqbal", "Johar") to its gazetteer
+    name in `city` (default: the current shard's), or None if it cannot be
+    recognised or the city has no gazetteer.
+    """
+    city = city or _current_city()
+    if city not in GAZETTEERS:
+        return None
+    return _normalize(city, name)
+
+
+@lru_cache(maxsize=1024)
+def _normalize(city, name):
+    if not name:
+        return None
+
+    key = _key(name)
+    if not key:
+        return None
+    canonical = _CANONICAL_BY_KEY[city]
+    if key in canonical:
+        return canonical[key]
+
+    # "Gulshan Block 13" -> "Gulshan-e-Iqbal": longest known key the input starts with
+    prefixes = [k for k in canonical if key.startswith(k) and len(k) >= 4]
+    if prefixes:
+        return canonical[max(prefixes, key=len)]
+
+    close = get_close_matches(key, canonical.keys(), n=1, cutoff=0.85)
+    return canonical[close[0]] if close else None
+
+
+def zone_point(name, city=None):
+    """Planar (x_km, y_km) for a zone name, or None if unknown."""
+    city = city or _current_city()
+    canonical = normalize_zone(name, city)
+    if not canonical:
+        return None
+    lat, lon = GAZETTEERS[city][0][canonical]
+    return lon * _KM_PER_DEG_LON[city], lat * _KM_PER_DEG_LAT
+
+
+def zone_distance_km(zone_a, zone_b, city=None):
+    """Straight-line distance between two zone centroids, or None if either is unknown."""
+    a, b = zone_point(zone_a, city), zone_point(zone_b, city)
+    if a is None or b is None:
+        return None
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class NGOIndex:
+    """
+    Immutable uniform-grid index over NGO locations.
+
+    Built from NGO rows once; answers "k nearest NGOs accepting category X
+    (with pickup)" by scanning grid rings outward from the query point and
+    stopping as soon as no unvisited cell can beat the current k-th result.
+    NGOs whose zone is not in the gazetteer are kept in `unlocated`.
+    """
+
+    def __init__(self, ngos, cell_km=GRID_CELL_KM, version=0):
+        self.version = version  # cache version the NGOs were read under
+        self.cell_km = cell_km
+        self.entries = []     # (ngo_id, x, y, category_mask, has_pickup)
+        self.unlocated = []   # ngo ids without a known zone
+        self.cells = {}
+
+        for ngo in ngos:
+            point = zone_point(ngo.zone)
+            if point is None:
+                self.unlocated.append(ngo.id)
+                continue
+            idx = len(self.entries)
+            self.entries.append((ngo.id, point[0], point[1], ngo.category_mask or 0, bool(ngo.has_pickup)))
+            self.cells.setdefault(self._cell(*point), []).append(idx)
+
+        if self.cells:
+            xs = [c[0] for c in self.cells]
+            ys = [c[1] for c in self.cells]
+            self._bounds = (min(xs), max(xs), min(ys), max(ys))
+
+        if np is not None and self.entries:
+            self._xy = np.array([(e[1], e[2]) for e in self.entries], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_km)), int(math.floor(y / self.cell_km))
+
+    def _matches(self, entry, category_bit, pickup):
+        if category_bit and not entry[3] & category_bit:
+            return False
+        if pickup and not entry[4]:
+            return False
+        return True
+
+    def nearest(self, zone, k=5, category=None, pickup=False):
+        """
+        Return up to k (ngo_id, distance_km) pairs sorted by distance from
+        `zone` (a zone name or an (x_km, y_km) point). Empty if the zone is unknown.
+        """
+        point = zone if isinstance(zone, tuple) else zone_point(zone)
+        bit = category_bit(category)
+        if point is None or not self.entries or k <= 0 or (category and not bit):
+            return []
+
+        qx, qy = point
+        cx, cy = self._cell(qx, qy)
+        found = []  # (distance, ngo_id)
+
+        # rings are visited from the query cell outward, up to the furthest occupied cell
+        min_x, max_x, min_y, max_y = self._bounds
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+
+        for ring in range(0, last_ring + 1):
+            # nothing in this ring is closer than (ring - 1) cells to the query
+            if len(found) >= k and (ring - 1) * self.cell_km > found[k - 1][0]:
+                break
+
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in (range(cy - ring, cy + ring + 1) if abs(gx - cx) == ring else (cy - ring, cy + ring)):
+                    for idx in self.cells.get((gx, gy), ()):
+                        entry = self.entries[idx]
+                        if self._matches(entry, bit, pickup):
+                            found.append((math.hypot(entry[1] - qx, entry[2] - qy), entry[0]))
+            found.sort()
+
+        return [(ngo_id, dist) for dist, ngo_id in found[:k]]
+
+    def nearest_many(self, zones, k=5, category=None, pickup=False):
+        """
+        Batch version of nearest() for many query zones at once. With numpy
+        available the full query x candidate distance matrix is computed in
+        one vectorised pass.
+        """
+        if np is None or not self.entries:
+            return [self.nearest(z, k=k, category=category, pickup=pickup) for z in zones]
+
+        points = [z if isinstance(z, tuple) else zone_point(z) for z in zones]
+        known = [i for i, p in enumerate(points) if p is not None]
+        results = [[] for _ in zones]
+
+        bit = category_bit(category)
+        candidates = [i for i, e in enumerate(self.entries) if self._matches(e, bit, pickup)]
+        if not known or not candidates or k <= 0 or (category and not bit):
+            return results
+
+        q = np.array([points[i] for i in known], dtype=np.float64)
+        c = self._xy[candidates]
+        dist = np.sqrt(((q[:, None, :] - c[None, :, :]) ** 2).sum(axis=2))
+
+        kk = min(k, len(candidates))
+        top = np.argpartition(dist, kk - 1, axis=1)[:, :kk]
+        for row, qi in enumerate(known):
+            order = top[row][np.argsort(dist[row, top[row]])]
+            results[qi] = [(self.entries[candidates[j]][0], float(dist[row, j])) for j in order]
+        return results
+
+
+_indexes = {}  # shard key -> NGOIndex
+_index_lock = threading.Lock()
+
+
+def get_ngo_index():
+    """
+    Process-wide NGOIndex over all NGOs of the current city shard, built
+    lazily and rebuilt once any process commits a change to indexed NGO
+    data (checked through the shared cache version).
+    """
+    key = current_shard()
+    version = current_version(NGO_INDEX)
+    index = _indexes.get(key)
+    if index is not None and index.version == version:
+        return index
+
+    from models import NGO
+
+    with _index_lock:
+        index = _indexes.get(key)
+        if index is None or index.version != version:
+            index = _indexes[key] = NGOIndex(NGO.query.all(), version=version)
+        return index
+
+
+_INDEXED_COLUMNS = ("zone", "category_mask", "has_pickup")
+
+
+def _note_indexed_change(session, _flush_context, _instances):
+    # assignments bump NGO.current_load on every donation; only rebuild
+    # when something the index actually stores has changed
+    from models import NGO
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, NGO):
+            continue
+        state = inspect(obj)
+        if (
+            obj in session.new
+            or obj in session.deleted
+            or any(state.attrs[name].history.has_changes() for name in _INDEXED_COLUMNS)
+        ):
+            bump_version(session, NGO_INDEX)
+            return
+
+
+def init_zone_index(app):
+    """Bump the NGO index's cache version whenever indexed NGO data changes."""
+    if not event.contains(ShardedSession, "before_flush", _note_indexed_change):
+        event.listen(ShardedSession, "before_flush", _note_indexed_change)